@@ -0,0 +1,51 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from risk_calculator.models import get_asset_path, get_model_bundle
+from risk_calculator.utils import get_title_mapping
+from risk_calculator.explanations import renderers
+
+#Times every explanation renderer on the same shap values, using rows of the imputer training data
+#as patients, and reports latency and the size of the data uri sent back in the callback response.
+
+def get_samples(bundle, n):
+    fit_X = bundle["imputer"]._fit_X
+    rows = np.random.RandomState(0).choice(len(fit_X), min(n, len(fit_X)), replace=False)
+    X = pd.DataFrame(bundle["imputer"].transform(fit_X[rows]), columns=bundle["columns"])
+    return X, bundle["explainer"].shap_values(X)
+
+def benchmark(m, labs, n, repeat):
+    bundle = get_model_bundle(m, labs)
+    X, shap_values = get_samples(bundle, n)
+    names = [get_title_mapping()[0][c] for c in bundle["columns"]]
+    results = {}
+    for name, render in renderers.items():
+        times = []
+        sizes = []
+        for i in range(len(X)):
+            x = X.iloc[[i]]
+            for _ in range(repeat):
+                start = time.perf_counter()
+                uri = render(bundle["explainer"].expected_value, shap_values[[i]], x, names)
+                times.append(time.perf_counter()-start)
+            sizes.append(len(uri))
+        results[name] = (np.median(times), np.percentile(times, 95), np.mean(sizes))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the shap explanation renderers.')
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print('{:<12}{:<8}{:<12}{:>12}{:>12}{:>14}'.format('task', 'labs', 'renderer', 'median ms', 'p95 ms', 'mean bytes'))
+    for m in [True, False]:
+        for labs in [True, False]:
+            if not os.path.exists(get_asset_path(m, labs, 'model_explainer')):
+                continue
+            for name, (median, p95, size) in benchmark(m, labs, args.samples, args.repeat).items():
+                print('{:<12}{:<8}{:<12}{:>12.1f}{:>12.1f}{:>14.0f}'.format(
+                    'mortality' if m else 'infection', str(labs), name, 1000*median, 1000*p95, size))
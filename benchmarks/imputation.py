@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from risk_calculator.models import get_asset_path, load_asset, get_features
+from risk_calculator.imputation import build_imputer_index, impute, impute_exact, verify_imputer_index
+
+#Compares the indexed imputation against KNNImputer.transform on calculator-like rows: training
+#rows with noise added and some numeric features left blank, as in a form with missing lab values.
+#Rows are checked one at a time, as the calculator imputes them, and a row that differs from
+#transform's in any bit stops the benchmark.
+
+def get_rows(m, labs, imputer, n, missing_rate):
+    rng = np.random.RandomState(0)
+    fit_X = imputer._fit_X.astype(float)
+    rows = fit_X[rng.randint(len(fit_X), size=n)]
+    rows = np.round(rows + rng.normal(0, 0.5, rows.shape)*(fit_X.std(axis=0) > 0), 1)
+    #Age is required by the form, every other numeric feature may be missing
+    optional = [f["index"] for f in get_features(m, labs)["numeric"] if f["name"] != "Age"]
+    mask = np.zeros(rows.shape, dtype=bool)
+    mask[:, optional] = rng.rand(n, len(optional)) < missing_rate
+    rows[mask] = np.nan
+    return rows
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter()-start
+
+def benchmark(m, labs, n, missing_rate):
+    imputer = load_asset(m, labs, 'imputer')["imputer"]
+    index = build_imputer_index(imputer)
+    rows = get_rows(m, labs, imputer, n, missing_rate)
+    if not verify_imputer_index(index, rows):
+        raise SystemExit('{} imputation (labs={}) differs from KNNImputer.transform'.format('mortality' if m else 'infection', labs))
+    _, fallback = impute_exact(build_imputer_index(imputer), rows.copy())
+    _, batch_sklearn = timed(imputer.transform, rows)
+    _, batch_index = timed(impute, index, rows)
+    single_sklearn = np.median([timed(imputer.transform, rows[i:i+1])[1] for i in range(n)])
+    single_index = np.median([timed(impute, index, rows[i:i+1])[1] for i in range(n)])
+    return {
+        "fallback": len(fallback)/n,
+        "single": (single_sklearn, single_index),
+        "batch": (batch_sklearn, batch_index)
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the indexed imputation with KNNImputer.transform.')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--missing', type=float, default=0.3)
+    args = parser.parse_args()
+    print('{:<12}{:<8}{:>10}{:>22}{:>24}'.format('task', 'labs', 'fallback', 'row ms sklearn/index', 'batch ms sklearn/index'))
+    for m in [True, False]:
+        for labs in [True, False]:
+            if not os.path.exists(get_asset_path(m, labs, 'imputer')):
+                continue
+            r = benchmark(m, labs, args.rows, args.missing)
+            print('{:<12}{:<8}{:>9.1f}%{:>13.3f}/{:<8.3f}{:>14.1f}/{:<9.1f}'.format(
+                'mortality' if m else 'infection', str(labs), 100*r["fallback"],
+                1000*r["single"][0], 1000*r["single"][1], 1000*r["batch"][0], 1000*r["batch"][1]))
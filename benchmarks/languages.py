@@ -0,0 +1,33 @@
+import time
+import timeit
+
+import risk_calculator.english as english
+import risk_calculator.spanish as spanish
+import risk_calculator.italian as italian
+from risk_calculator.utils import get_languages, get_title_mapping
+
+#Reports what the localization tables cost at startup and what a lookup costs in a callback,
+#next to rebuilding the title mapping on every call as the risk callbacks used to.
+
+def rebuild_title_mapping():
+    return {
+        0: english.get_feature_names(),
+        1: spanish.get_feature_names(),
+        2: italian.get_feature_names()
+    }
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    languages = get_languages()
+    print('get_languages, first call (unpickles the model data): {:.1f} ms'.format(1000*(time.perf_counter()-start)))
+    start = time.perf_counter()
+    title_mapping = get_title_mapping()
+    print('get_title_mapping, first call: {:.3f} ms'.format(1000*(time.perf_counter()-start)))
+    n = 100000
+    lookup = timeit.timeit(lambda: get_languages()[("visual_1", 1)], number=n)/n
+    title = timeit.timeit(lambda: get_title_mapping()[1]["Age"], number=n)/n
+    rebuilt = timeit.timeit(lambda: rebuild_title_mapping()[1]["Age"], number=n//10)/(n//10)
+    print('{} localized entries'.format(len(languages)))
+    print('content lookup: {:.2f} us'.format(1e6*lookup))
+    print('title lookup, cached: {:.2f} us'.format(1e6*title))
+    print('title lookup, rebuilt per call: {:.2f} us'.format(1e6*rebuilt))
@@ -0,0 +1,312 @@
+import os
+import re
+import sys
+import json
+import time
+import types
+import datetime
+import argparse
+import resource
+import platform
+import importlib
+import subprocess
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+#Replays the callback requests a browser sends for each page against the app's Flask server,
+#through its test client, and reports latency percentiles, requests per second for the one
+#process (a gunicorn worker's share) and peak resident memory. --record writes the requests to
+#a json file by loading each page the way the Dash renderer does: display_page for the path,
+#then every callback whose inputs are on the page, again for the ones whose inputs those
+#changed, and once more after filling in the forms with the examples they show, making the
+#choices below and pressing every button. A request that fails while recording, for data the
+#checkout does not have, is left out and reported, so errors in a replay are new failures.
+#Requests copied from the browser's network tab can be added to the file by hand.
+#--save writes the results as json and --compare prints them next to a saved run, to compare
+#commits on one machine.
+payloads_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replay_payloads.json')
+pages = ['/projections', '/ventilator_allocation', '/policies', '/mortality_calculator',
+         '/infection_calculator', '/interactive-graph', '/dataset']
+#modules whose pages start from today's date
+dated_modules = ['homepage', 'projections.map', 'projections.utils', 'policies.graphs']
+max_rounds = 5
+#what a user picks on the pages that have nothing to press: component id, property and value
+choices = {
+    '/policies': [
+        ({'type': 'lockdown', 'index': 0}, 'value', ['Lockdown']),
+        ({'type': 'timeline', 'index': 0}, 'value', 0),
+        ({'type': 'mass', 'index': 1}, 'value', ['Mass_Gatherings']),
+        ({'type': 'schools', 'index': 1}, 'value', ['Schools']),
+        ({'type': 'others', 'index': 1}, 'value', ['Others']),
+        ({'type': 'timeline', 'index': 1}, 'value', 2),
+        ({'type': 'none', 'index': 2}, 'value', ['No_Measure']),
+        ({'type': 'timeline', 'index': 2}, 'value', 4)
+    ]
+}
+
+def pin_today(day):
+    #the pages cut their data at today, pinning it keeps runs comparable as the calendar moves on
+    class PinnedDate(datetime.date):
+        @classmethod
+        def today(cls):
+            return day
+    clock = types.SimpleNamespace(**{k: getattr(datetime, k) for k in dir(datetime) if not k.startswith('_')})
+    clock.date = PinnedDate
+    for name in dated_modules:
+        importlib.import_module(name).datetime = clock
+
+def get_app():
+    import index
+    return index.app
+
+def stringify_id(id):
+    return json.dumps(id, sort_keys=True, separators=(',', ':')) if isinstance(id, dict) else id
+
+def add_components(store, node):
+    #every component in a layout, as its json, keyed by id
+    if isinstance(node, list):
+        for child in node:
+            add_components(store, child)
+    elif isinstance(node, dict):
+        props = node.get("props")
+        if isinstance(props, dict) and "type" in node:
+            if "id" in props:
+                store[stringify_id(props["id"])] = props
+        else:
+            props = node
+        for value in props.values():
+            add_components(store, value)
+
+def match_ids(store, id):
+    #the ids on the page an input or state id stands for: a list of them for a wildcard id
+    if not id.startswith('{'):
+        return id if id in store else None
+    pattern = json.loads(id)
+    matches = []
+    for key, props in store.items():
+        other = props["id"]
+        if isinstance(other, dict) and set(other) == set(pattern) and all(
+                isinstance(v, list) or other[k] == v for k, v in pattern.items()):
+            matches.append(key)
+    return matches
+
+def get_spec(store, key, prop):
+    return {"id": store[key]["id"], "property": prop, "value": store[key].get(prop)}
+
+def get_body(callback, store, changed):
+    inputs = []
+    for group in ["inputs", "state"]:
+        specs = []
+        for dependency in callback[group]:
+            matches = match_ids(store, dependency["id"])
+            if matches is None:
+                return None
+            if isinstance(matches, list):
+                specs.append([get_spec(store, key, dependency["property"]) for key in matches])
+            else:
+                specs.append(get_spec(store, matches, dependency["property"]))
+        inputs.append(specs)
+    outputs = []
+    for output in callback["output"].strip('.').split('...'):
+        key, prop = output.rsplit('.', 1)
+        if key not in store:
+            return None
+        outputs.append({"id": store[key]["id"], "property": prop})
+    return {
+        "output": callback["output"],
+        "outputs": outputs if callback["output"].startswith('..') else outputs[0],
+        "inputs": inputs[0],
+        "state": inputs[1],
+        "changedPropIds": sorted(changed)
+    }
+
+def post(client, body):
+    start = time.perf_counter()
+    response = client.post('/_dash-update-component', json=body)
+    elapsed = time.perf_counter() - start
+    return response, elapsed
+
+def apply_response(store, response):
+    #what a callback changed: key.prop for the props it set, key alone for components it added
+    changed = set()
+    if response.status_code != 200:
+        return changed
+    for key, props in json.loads(response.get_data(as_text=True))["response"].items():
+        if key in store:
+            store[key].update(props)
+        before = set(store)
+        add_components(store, props)
+        changed |= {'{}.{}'.format(key, prop) for prop in props} | (set(store) - before)
+    return changed
+
+def get_triggers(store, callback, changed):
+    triggers = set()
+    for dependency in callback["inputs"]:
+        matches = match_ids(store, dependency["id"])
+        for key in matches if isinstance(matches, list) else [matches] if matches else []:
+            if key in changed or '{}.{}'.format(key, dependency["property"]) in changed:
+                triggers.add('{}.{}'.format(key, dependency["property"]))
+    return triggers
+
+def record_page(app, client, pathname):
+    store = {}
+    add_components(store, json.loads(json.dumps(app.layout, cls=PlotlyJSONEncoder)))
+    store["url"]["pathname"] = pathname
+    callbacks = [c for c in app._callback_list if not c.get("clientside_function")]
+    bodies = []
+    failed = 0
+    changed = {'url.pathname'}
+    pressed = False
+    for _ in range(max_rounds):
+        fired = []
+        for callback in callbacks:
+            triggers = get_triggers(store, callback, changed)
+            body = get_body(callback, store, triggers) if triggers else None
+            if body is not None:
+                fired.append(body)
+        changed = set()
+        for body in fired:
+            response, _ = post(client, body)
+            if response.status_code in [200, 204]:
+                bodies.append(body)
+            else:
+                failed += 1
+            changed |= apply_response(store, response)
+        if not changed and not pressed:
+            #then fill in the forms with their examples and press every button the callbacks listen to, once
+            pressed = True
+            for key, props in store.items():
+                example = re.match(r'e\.g\. (-?[\d.]+)$', str(props.get("placeholder")))
+                if props.get("type") == 'number' and props.get("value") is None and example:
+                    props["value"] = float(example.group(1))
+                    changed.add('{}.value'.format(key))
+            for id, prop, value in choices.get(pathname, []):
+                key = stringify_id(id)
+                store[key][prop] = value
+                changed.add('{}.{}'.format(key, prop))
+            buttons = {d["id"] for c in callbacks for d in c["inputs"] if d["property"] == 'n_clicks' and d["id"] in store}
+            for key in buttons:
+                store[key]["n_clicks"] = (store[key].get("n_clicks") or 0) + 1
+                changed.add('{}.n_clicks'.format(key))
+        if not changed:
+            break
+    return bodies, failed
+
+def record(app, today):
+    client = app.server.test_client()
+    app.server.logger.disabled = True
+    recorded = {"today": today.isoformat(), "pages": {}}
+    for pathname in pages:
+        recorded["pages"][pathname], failed = record_page(app, client, pathname)
+        print('recorded {} requests for {}{}'.format(len(recorded["pages"][pathname]), pathname,
+                                                    ', left out {} that failed'.format(failed) if failed else ''))
+    return recorded
+
+def replay(app, payloads, iterations, clear_caches):
+    from projections.figure_cache import clear_figure_cache
+    from risk_calculator.prediction_cache import clear_prediction_cache
+    from layout_cache import clear_layout_cache
+    client = app.server.test_client()
+    #failing callbacks are counted as errors, their tracebacks would drown the report
+    app.server.logger.disabled = True
+    #one untimed pass, so the first imports and cache fills of each page are not counted
+    for bodies in payloads["pages"].values():
+        for body in bodies:
+            post(client, body)
+    results = {}
+    start = time.perf_counter()
+    for pathname, bodies in payloads["pages"].items():
+        times = []
+        errors = 0
+        page_start = time.perf_counter()
+        for _ in range(iterations):
+            if clear_caches:
+                clear_figure_cache()
+                clear_prediction_cache()
+                clear_layout_cache()
+            for body in bodies:
+                response, elapsed = post(client, body)
+                times.append(elapsed)
+                errors += response.status_code not in [200, 204]
+        results[pathname] = summarize(times, time.perf_counter() - page_start, errors)
+    total = time.perf_counter() - start
+    times = [t for r in results.values() for t in r.pop("times")]
+    results['all'] = summarize(times, total, sum(r["errors"] for r in results.values()))
+    results['all'].pop("times")
+    return results
+
+def summarize(times, seconds, errors):
+    times = np.array(times) if times else np.zeros(1)
+    return {
+        "requests": len(times),
+        "errors": errors,
+        "p50_ms": 1000*float(np.percentile(times, 50)),
+        "p95_ms": 1000*float(np.percentile(times, 95)),
+        "p99_ms": 1000*float(np.percentile(times, 99)),
+        "requests_per_s": len(times)/seconds if seconds else 0.0,
+        "times": times.tolist()
+    }
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(report, baseline):
+    print('commit {}, {} iterations, peak rss {:.0f} MB'.format(report["commit"], report["iterations"], report["peak_rss_mb"]), end='')
+    print(' (was {:.0f} MB at {})'.format(baseline["peak_rss_mb"], baseline["commit"]) if baseline else '')
+    print('{:<24}{:>9}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('page', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'))
+    for pathname, r in report["pages"].items():
+        print('{:<24}{:>9}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}'.format(
+            pathname, r["requests"], r["errors"], r["p50_ms"], r["p95_ms"], r["p99_ms"], r["requests_per_s"]))
+        was = baseline["pages"].get(pathname) if baseline else None
+        if was:
+            print('{:<24}{:>9}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}'.format(
+                '  was', was["requests"], was["errors"], was["p50_ms"], was["p95_ms"], was["p99_ms"], was["requests_per_s"]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded Dash callback requests for every page and report latency, throughput and memory.')
+    parser.add_argument('--payloads', default=payloads_path)
+    parser.add_argument('--record', action='store_true', help='record the requests into --payloads instead of replaying them')
+    parser.add_argument('--today', help='the date the pages are loaded on, YYYY-MM-DD (by default the recorded one)')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--clear-caches', action='store_true', help='empty the figure, prediction and layout caches before every iteration')
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    payloads = None
+    if not args.record:
+        with open(args.payloads) as file:
+            payloads = json.load(file)
+    today = args.today or (payloads["today"] if payloads else datetime.date.today().isoformat())
+    pin_today(datetime.datetime.strptime(today, '%Y-%m-%d').date())
+    app = get_app()
+    if args.record:
+        with open(args.payloads, 'w') as file:
+            json.dump(record(app, datetime.datetime.strptime(today, '%Y-%m-%d').date()), file, indent=1)
+        sys.exit(0)
+
+    results = replay(app, payloads, args.iterations, args.clear_caches)
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "today": today,
+        "iterations": args.iterations,
+        "clear_caches": args.clear_caches,
+        #ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        "pages": results
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=1)
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+#Compares the ways the policy scenarios can be loaded: json.load of US_Scenarios.json alone, as the
+#app used to load it, parsing it into the scenario cube, and the columnar copy of the cube, mapped
+#or, when written compressed, read into memory. Each is loaded in a fresh interpreter
+#and reported with its file size, its load time and what the process's resident memory grew by
+#once every value has been read, in all and in anonymous (process private) pages. Mapped pages
+#are file pages that the page cache shares between workers, parsed ones are anonymous.
+code = '''
+import json, time
+from columnar import read_arrays
+from policies.scenarios import parse_policy_scenarios, make_scenario_cube
+
+def get_memory():
+    memory = {{}}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            name, value = line.split(':', 1)
+            if name in ['Rss', 'Anonymous']:
+                memory[name.lower()] = int(value.split()[0])*1024
+    return memory
+
+path = {path!r}
+before = get_memory()
+start = time.perf_counter()
+{load}
+elapsed = time.perf_counter() - start
+{touch}
+after = get_memory()
+print(json.dumps({{"load_ms": 1000*elapsed, "rss_mb": (after["rss"] - before["rss"])/2**20,
+                  "anonymous_mb": (after["anonymous"] - before["anonymous"])/2**20}}))
+'''
+
+#what each way runs, and what it then reads so that every value is in memory
+loads = {
+    'json': ('scenarios = json.load(open(path))', ''),
+    'parse': ('cube = make_scenario_cube(*parse_policy_scenarios(path))', 'cube["series"].sum(), cube["truth"].sum()'),
+    'columnar': ('cube = make_scenario_cube(*read_arrays(path))', 'cube["series"].sum(), cube["truth"].sum()')
+}
+
+def get_compressions():
+    compressions = [None, 'gzip']
+    try:
+        import zstandard
+        compressions.append('zstd')
+    except ImportError:
+        pass
+    return compressions
+
+def measure(load, path):
+    result = subprocess.run([sys.executable, '-c', code.format(load=loads[load][0], touch=loads[load][1], path=path)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), size_kb=os.path.getsize(path)/1024)
+
+def fastest(load, path, repeat):
+    #the fastest of a few runs, the first one also pays for cold disk caches
+    return min((measure(load, path) for _ in range(repeat)), key=lambda r: r["load_ms"])
+
+def print_report(report, baseline):
+    print('{:<12}{:>10}{:>10}{:>10}{:>14}'.format('format', 'size KB', 'load ms', 'rss MB', 'anonymous MB'))
+    for name, r in report.items():
+        print('{:<12}{:>10.0f}{:>10.1f}{:>10.1f}{:>14.1f}'.format(name, r["size_kb"], r["load_ms"], r["rss_mb"], r["anonymous_mb"]))
+        was = baseline.get(name) if baseline else None
+        if was:
+            print('{:<12}{:>10.0f}{:>10.1f}{:>10.1f}{:>14.1f}'.format('  was', was["size_kb"], was["load_ms"], was["rss_mb"], was["anonymous_mb"]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare loading the policy scenarios from json and from the columnar copy.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    from policies.scenarios import scenarios_path, parse_policy_scenarios, write_policy_scenarios
+    report = {
+        "json": fastest('json', scenarios_path, args.repeat),
+        "json → cube": fastest('parse', scenarios_path, args.repeat)
+    }
+    cube = parse_policy_scenarios()
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in get_compressions():
+            path = os.path.join(directory, 'US_Scenarios.columnar')
+            write_policy_scenarios(path, cube, compression)
+            report[compression or 'columnar'] = fastest('columnar', path, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=1)
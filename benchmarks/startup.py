@@ -0,0 +1,68 @@
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+#Imports a module (the app by default) in a fresh interpreter under python -X importtime and
+#reports what its import cost, by top level package, and which of the heavy libraries it pulled
+#in. --save writes the report to a json file and --compare prints the change against one, so
+#the cost before and after a change can be put side by side.
+heavy_modules = ['pandas', 'scipy', 'sklearn', 'xgboost', 'shap', 'matplotlib']
+
+def measure(module):
+    code = 'import sys, json, {0}; print(json.dumps([m for m in {1!r} if m in sys.modules]))'.format(module, heavy_modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+        if not name[1:].startswith(' '):
+            #imported by the -c code itself rather than by another module
+            total += int(cumulative_us)
+    return {
+        "module": module,
+        "total_ms": total/1000,
+        "packages_ms": {k: v/1000 for k, v in packages.items()},
+        "heavy": json.loads(result.stdout.strip().splitlines()[-1])
+    }
+
+def print_report(report, baseline, top):
+    print('import {}: {:.0f} ms'.format(report["module"], report["total_ms"]), end='')
+    print(' (was {:.0f} ms)'.format(baseline["total_ms"]) if baseline else '')
+    print('heavy libraries loaded: {}'.format(', '.join(report["heavy"]) or 'none'), end='')
+    print(' (was {})'.format(', '.join(baseline["heavy"]) or 'none') if baseline else '')
+    names = set(report["packages_ms"]) | set(baseline["packages_ms"] if baseline else [])
+    def cost(name):
+        return max(report["packages_ms"].get(name, 0), baseline["packages_ms"].get(name, 0) if baseline else 0)
+    print('{:<28}{:>10}{}'.format('package', 'ms', '{:>10}'.format('was ms') if baseline else ''))
+    for name in sorted(names, key=cost, reverse=True)[:top]:
+        line = '{:<28}{:>10.1f}'.format(name, report["packages_ms"].get(name, 0))
+        if baseline:
+            line += '{:>10.1f}'.format(baseline["packages_ms"].get(name, 0))
+        print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the import cost of the app at worker startup.')
+    parser.add_argument('--module', default='index')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    #the fastest of a few runs, the first one also pays for cold disk caches
+    report = min((measure(args.module) for _ in range(args.repeat)), key=lambda r: r["total_ms"])
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(report, baseline, args.top)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=1)
@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from risk_calculator.models import get_asset_path, load_asset
+from risk_calculator.trees import export_trees, predict_proba, verify_trees
+
+#Checks the exported trees bit for bit against model.predict_proba on each model's imputer training
+#data, as is and with noise added, and times both on one row and on the whole set.
+
+def timed(f, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f(*args)
+    return (time.perf_counter()-start)/repeat
+
+def benchmark(m, labs, repeat):
+    model = load_asset(m, labs, 'model_explainer')["model"]
+    X = load_asset(m, labs, 'imputer')["imputer"]._fit_X.astype(float)
+    noisy = np.round(X + np.random.RandomState(0).normal(0, 1, X.shape), 2)
+    start = time.perf_counter()
+    trees = export_trees(model)
+    export = time.perf_counter()-start
+
+    def xgboost_proba(X):
+        return model.predict_proba(X, validate_features=False)
+
+    return {
+        "trees": len(trees["roots"]),
+        "export": export,
+        "mismatches": verify_trees(trees, model, X) + verify_trees(trees, model, noisy),
+        "rows": 2*len(X),
+        "single": (timed(xgboost_proba, noisy[:1], repeat=repeat), timed(predict_proba, trees, noisy[:1], repeat=repeat)),
+        "batch": (timed(xgboost_proba, noisy), timed(predict_proba, trees, noisy))
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify and time the exported xgboost trees.')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    for m in [True, False]:
+        for labs in [True, False]:
+            if not os.path.exists(get_asset_path(m, labs, 'model_explainer')):
+                continue
+            r = benchmark(m, labs, args.repeat)
+            print('{} {}: {} trees exported in {:.0f} ms, {} of {} scores differ'.format(
+                'mortality' if m else 'infection', 'labs' if labs else 'without labs',
+                r["trees"], 1000*r["export"], r["mismatches"], r["rows"]))
+            print('  one row: xgboost {:.3f} ms, trees {:.3f} ms'.format(1000*r["single"][0], 1000*r["single"][1]))
+            print('  all rows: xgboost {:.1f} ms, trees {:.1f} ms'.format(1000*r["batch"][0], 1000*r["batch"][1]))
@@ -0,0 +1,49 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from risk_calculator.models import get_asset_path, load_asset
+from risk_calculator.trees import export_trees
+from risk_calculator.treeshap import build_shap_tables, shap_values, verify_shap_tables
+
+#Compares the SHAP tables with explainer.shap_values on each model's imputer training data, as is
+#and with noise added, and times an explanation of one row, as the calculator asks for it, and of
+#the whole set, as the batch endpoint does.
+
+def timed(f, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f(*args)
+    return (time.perf_counter()-start)/repeat
+
+def benchmark(m, labs, repeat):
+    model_pickle = load_asset(m, labs, 'model_explainer')
+    explainer = model_pickle["explainer"]
+    X = load_asset(m, labs, 'imputer')["imputer"]._fit_X.astype(float)
+    noisy = np.round(X + np.random.RandomState(0).normal(0, 1, X.shape), 2)
+    trees = export_trees(model_pickle["model"])
+    start = time.perf_counter()
+    tables = build_shap_tables(trees)
+    build = time.perf_counter()-start
+    return {
+        "build": build,
+        "max_diff": max(verify_shap_tables(trees, tables, explainer, X), verify_shap_tables(trees, tables, explainer, noisy)),
+        "single": (timed(explainer.shap_values, noisy[:1], repeat=repeat), timed(shap_values, trees, tables, noisy[:1], repeat=repeat)),
+        "batch": (timed(explainer.shap_values, noisy), timed(shap_values, trees, tables, noisy))
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the SHAP tables with the TreeExplainer.')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    for m in [True, False]:
+        for labs in [True, False]:
+            if not os.path.exists(get_asset_path(m, labs, 'model_explainer')):
+                continue
+            r = benchmark(m, labs, args.repeat)
+            print('{} {}: tables built in {:.0f} ms, largest difference {:.2g}'.format(
+                'mortality' if m else 'infection', 'labs' if labs else 'without labs', 1000*r["build"], r["max_diff"]))
+            print('  one row: explainer {:.3f} ms, tables {:.3f} ms'.format(1000*r["single"][0], 1000*r["single"][1]))
+            print('  all rows: explainer {:.1f} ms, tables {:.1f} ms'.format(1000*r["batch"][0], 1000*r["batch"][1]))
@@ -5,7 +5,8 @@ from dash.dependencies import Output, Input
 import flask
 
 from projections.visuals_funcs import build_us_map, get_stat, build_continent_map, build_state_projection
-from projections.utils import get_df_projections, get_world_map_text
+from projections.utils import get_country_options, get_province_options, get_world_map_text, get_countries_with_provinces
+from projections.figure_cache import get_figure_cache_stats
 
 def register_callbacks(app):
     @app.server.route('/DELPHI_documentation_pdf', methods=['GET', 'POST'])
@@ -18,6 +19,10 @@ def register_callbacks(app):
         return flask.send_from_directory(directory=os.path.join(app.server.root_path, "assets/documentations"),
                                          filename="Policy_Eval_Documentation.pdf")
 
+    @app.server.route('/projections_figure_cache', methods=['GET'])
+    def projections_figure_cache_stats():
+        return flask.jsonify(get_figure_cache_stats())
+
     #Reset country_dropdown when main location (scope) changes
     @app.callback(
         [Output('country_dropdown', 'options'),
@@ -25,14 +30,8 @@ def register_callbacks(app):
          Output('country_dropdown', 'disabled')],
         [Input('location_map_dropdown', 'value')])
     def set_countries_options(selected_continent):
-        if selected_continent == 'World':
-            df_projections = get_df_projections()
-            df = df_projections[(df_projections.Continent != 'None') & (df_projections.Country != 'None')]
-            return [[{'label': i, 'value': i} for i in df.Country.unique()], None, False]
         if selected_continent != 'US':
-            df_projections = get_df_projections()
-            df = df_projections[(df_projections.Continent == selected_continent) & (df_projections.Country != 'None')]
-            return [[{'label': i, 'value': i} for i in df.Country.unique()], None, False]
+            return [[{'label': i, 'value': i} for i in get_country_options(selected_continent)], None, False]
         else:
             return [[{'label': 'US', 'value': 'US'}], 'US', True]
 
@@ -57,13 +56,11 @@ def register_callbacks(app):
          Output('province_dropdown', 'disabled')],
         [Input('country_dropdown', 'value')])
     def set_province_options(selected_country):
-        countries_with_provinces = ["US","Canada","Australia"]
+        countries_with_provinces = get_countries_with_provinces()
         if selected_country is None or selected_country not in countries_with_provinces:
             return [[], None, True]
         else:
-            df = get_df_projections()
-            df = df[df.Country == selected_country]
-            return [[{'label': i, 'value': i} for i in df.Province.unique()], None, False]
+            return [[{'label': i, 'value': i} for i in get_province_options(selected_country)], None, False]
 
     @app.callback(
         Output('state_projection_graph', 'children'),
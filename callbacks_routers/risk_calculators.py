@@ -1,7 +1,5 @@
 import os
-import base64
-from io import BytesIO
-
+import flask
 import dash_html_components as html
 from dash.dependencies import Input, Output, State, ALL
 
@@ -9,31 +7,59 @@ from risk_calculator.mortality.calculator import valid_input_mort, predict_risk_
 from risk_calculator.infection.calculator import valid_input_infec, predict_risk_infec, get_infec_oxygen_cols
 from risk_calculator.features import build_feature_cards, build_feature_importance_graph, oxygen_options
 from risk_calculator.utils import get_languages, build_lab_ques_card, labs_ques
+from risk_calculator.models import get_asset_path, get_columns
+from risk_calculator.batch import read_patients, score_patients, stream_json, stream_csv, max_batch_rows
+from risk_calculator.prediction_cache import get_prediction_cache_stats
+from risk_calculator.render_pool import get_render_pool_stats
 
 def register_callbacks(app):
     languages = get_languages()
     oxygen_in_infec, oxygen_infec_ind = get_infec_oxygen_cols()
     oxygen_in_mort, oxygen_mort_ind = get_mort_oxygen_cols()
-    #displaying shap image
-    @app.server.route("/")
-    def display_fig(img, close_all=True):
-        imgByteArr = BytesIO()
-        img.savefig(imgByteArr, format='PNG')
-        imgByteArr = imgByteArr.getvalue()
-        encoded=base64.b64encode(imgByteArr)
-        return 'data:image/png;base64,{}'.format(encoded.decode())
+
+    @app.server.route('/risk_prediction_cache', methods=['GET'])
+    def risk_prediction_cache_stats():
+        return flask.jsonify(get_prediction_cache_stats())
+
+    @app.server.route('/risk_render_pool', methods=['GET'])
+    def risk_render_pool_stats():
+        return flask.jsonify(get_render_pool_stats())
+
+    #batch scoring: POST a csv or json array of patients to /api/risk/mortality or /api/risk/infection
+    #with ?labs=1, ?temperature=C, ?shap=1 and ?format=csv as options
+    @app.server.route('/api/risk/<task>', methods=['POST'])
+    def score_risk_batch(task):
+        if task not in ['mortality', 'infection']:
+            flask.abort(404)
+        args = flask.request.args
+        m = task == 'mortality'
+        labs = args.get('labs', '0').lower() in ['1', 'true', 'yes']
+        if not os.path.exists(get_asset_path(m, labs, 'model_explainer')):
+            flask.abort(404, "No {} model {} lab values.".format(task, 'with' if labs else 'without'))
+        try:
+            patients = read_patients(flask.request)
+        except ValueError as e:
+            flask.abort(400, str(e))
+        if len(patients) > max_batch_rows:
+            flask.abort(413, "At most {} patients per request.".format(max_batch_rows))
+        temp_unit = ["°C" if args.get('temperature', 'F').upper().lstrip('°') == 'C' else "°F"]
+        with_shap = args.get('shap', '0').lower() in ['1', 'true', 'yes']
+        results = score_patients(m, labs, patients, temp_unit, 0, with_shap)
+        if args.get('format', 'json') == 'csv':
+            return flask.Response(stream_csv(results, get_columns(m, labs), with_shap), mimetype='text/csv')
+        return flask.Response(stream_json(results), mimetype='application/json')
 
     @app.callback(
         Output('page-desc-infection', 'children'),
         [Input('language-calc-infection', 'value')])
     def infection_page_desc(language):
-        return languages["page_desc_infection"][language]
+        return languages[("page_desc_infection", language)]
 
     @app.callback(
         Output('page-desc-mortality', 'children'),
         [Input('language-calc-mortality', 'value')])
     def mortality_page_desc(language):
-        return languages["page_desc_mortality"][language]
+        return languages[("page_desc_mortality", language)]
 
     @app.callback(
         Output('lab_values_indicator_infection_text', 'children'),
@@ -63,27 +89,27 @@ def register_callbacks(app):
         Output('features-infection-text', 'children'),
         [Input('language-calc-infection', 'value')])
     def infection_labs_card_text(language):
-        return html.H5(languages["insert_feat_text"][language])
+        return html.H5(languages[("insert_feat_text", language)])
 
     @app.callback(
         Output('features-mortality-text', 'children'),
         [Input('language-calc-mortality', 'value')])
     def mortality_labs_card_text(language):
-        return html.H5(languages["insert_feat_text"][language])
+        return html.H5(languages[("insert_feat_text", language)])
 
     @app.callback(
         Output('infection-model-desc', 'children'),
         [Input('lab_values_indicator_infection', 'value'),
         Input('language-calc-infection', 'value')])
     def get_infection_model_desc(labs,language):
-        return languages["technical_details_infection_labs"][language] if labs else languages["technical_details_infection_no_labs"][language]
+        return languages[("technical_details_infection_labs", language)] if labs else languages[("technical_details_infection_no_labs", language)]
 
     @app.callback(
         Output('mortality-model-desc', 'children'),
         [Input('lab_values_indicator', 'value'),
         Input('language-calc-mortality', 'value')])
     def get_mortality_model_desc(labs,language):
-        return languages["technical_details_mortality_labs"][language] if labs else languages["technical_details_mortality_no_labs"][language]
+        return languages[("technical_details_mortality_labs", language)] if labs else languages[("technical_details_mortality_no_labs", language)]
 
     if oxygen_in_mort:
         @app.callback(
@@ -95,7 +121,7 @@ def register_callbacks(app):
                     oxygen_mort_ind,
                     True,
                     have_val,
-                    languages["oxygen"][language],
+                    languages[("oxygen", language)],
                     language
                 )
 
@@ -109,7 +135,7 @@ def register_callbacks(app):
                     oxygen_infec_ind,
                     False,
                     have_val,
-                    languages["oxygen"][language],
+                    languages[("oxygen", language)],
                     language
                 )
 
@@ -165,13 +191,13 @@ def register_callbacks(app):
         Output('submit-features-calc-infection', 'children'),
         [Input('language-calc-infection', 'value')])
     def set_submit_button_infection(language):
-        return languages["submit"][language],
+        return languages[("submit", language)],
 
     @app.callback(
         Output('submit-features-calc', 'children'),
         [Input('language-calc-mortality', 'value')])
     def set_submit_button_mortality(language):
-        return languages["submit"][language],
+        return languages[("submit", language)],
 
     def switch_oxygen(vec,ind):
         #assume there is only 1 categorical variable
@@ -205,7 +231,7 @@ def register_callbacks(app):
     )
     def calc_risk_score(*argv):
         language = argv[0]
-        default = html.H4(languages["results_card_mortality"][language],className="score-calculator-card-content"),
+        default = html.H4(languages[("results_card_mortality", language)],className="score-calculator-card-content"),
         submit = argv[1]
         labs = argv[2]
         feats = argv[3:-1]
@@ -217,12 +243,8 @@ def register_callbacks(app):
             x = feats
             valid, err, x = valid_input_mort(labs,x,language)
             if valid:
-                score, imputed, fig = predict_risk_mort(labs,x,temp_unit,languages["results_card_mortality"][language],language)
-                if fig:
-                    image = display_fig(fig)
-                else:
-                    image = ''
-                return score,'',imputed,image,{"height":200},languages["visual_1"][language]
+                score, imputed, image = predict_risk_mort(labs,x,temp_unit,languages[("results_card_mortality", language)],language)
+                return score,'',imputed,image,{"height":200},languages[("visual_1", language)]
             else:
                 return default,err,'','',{},''
         #user has not clicked submit
@@ -243,7 +265,7 @@ def register_callbacks(app):
     )
     def calc_risk_score_infection(*argv):
         language = argv[0]
-        default = html.H4(languages["results_card_infection"][language][0],className="score-calculator-card-content-infection"),
+        default = html.H4(languages[("results_card_infection", language)][0],className="score-calculator-card-content-infection"),
         submit = argv[1]
         labs = argv[2]
         feats = argv[3:-1]
@@ -255,12 +277,8 @@ def register_callbacks(app):
             x = feats
             valid, err, x  = valid_input_infec(labs,x,language)
             if valid:
-                score, imputed, fig = predict_risk_infec(labs,x,temp_unit,languages["results_card_infection"][language],language)
-                if fig:
-                    image = display_fig(fig)
-                else:
-                    image = ''
-                return score,'',imputed,image,{"height":200},languages["visual_1"][language]
+                score, imputed, image = predict_risk_infec(labs,x,temp_unit,languages[("results_card_infection", language)],language)
+                return score,'',imputed,image,{"height":200},languages[("visual_1", language)]
             else:
                 return default,err,'','',{},''
         #user has not clicked submit
@@ -0,0 +1,290 @@
+import io
+import os
+import sys
+import gzip
+import json
+import mmap
+import struct
+import argparse
+import datetime
+import warnings
+import numpy as np
+import pandas as pd
+from pandas.errors import PerformanceWarning
+
+#Read-only copies of the tables the app loads, in a layout that is memory mapped instead of
+#parsed: a json header, then every array at a 64 byte aligned offset. The arrays handed out are
+#views of the mapping, so every gunicorn worker reads the same page cache pages instead of
+#holding its own copy. Frames are stored with the types their schema gives (see read_csv):
+#numeric columns as one (columns, rows) array per dtype, dates as datetime64 days and strings as
+#the smallest integer codes into a dictionary kept in the header. Strings are read back as pandas
+#Categoricals over those codes, which compare, sort and give unique values as the strings did,
+#and dates as the datetime.date objects the callbacks compare them with.
+#Files are written next to a temporary name and renamed over the old one, so a data refresh is
+#atomic: a reader maps either the old file or the new one, and a mapping outlives the rename.
+#A file can also be written compressed, with gzip or with zstd (the zstandard package), for a
+#smaller artifact to ship: it is then read into memory on load rather than mapped.
+#Check the sources and build the copies from the repository root with python -m columnar, the
+#app's warm-up also builds any that are missing or older than their source.
+magic = b'COLUMNAR4\n'
+alignment = 64
+#what a compressed file starts with
+signatures = {
+    'gzip': b'\x1f\x8b',
+    'zstd': b'\x28\xb5\x2f\xfd'
+}
+
+def get_columnar_path(path):
+    return os.path.splitext(path)[0] + '.columnar'
+
+def get_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def is_current(columnar_path, sources):
+    #a file built from older sources, or by an older version of this module, is ignored until it is rebuilt
+    mtime = get_mtime(columnar_path)
+    if mtime is None or any(mtime < os.path.getmtime(source) for source in sources):
+        return False
+    return read_head(columnar_path, len(magic)) == magic
+
+def compress(data, compression):
+    if compression == 'gzip':
+        buffer = io.BytesIO()
+        #no timestamp in the header, the same arrays compress to the same bytes
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as file:
+            file.write(data)
+        return buffer.getvalue()
+    import zstandard
+    return zstandard.ZstdCompressor(level=19).compress(data)
+
+def decompress(data, compression):
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+def write_image(file, data, start, arrays, header, end):
+    file.write(magic + struct.pack('<Q', len(data)) + data)
+    position = len(magic) + 8 + len(data)
+    for name, array in arrays.items():
+        offset = start + header["arrays"][name]["offset"]
+        file.write(bytes(offset - position))
+        file.write(np.ascontiguousarray(array).tobytes())
+        position = offset + array.nbytes
+    file.write(bytes(end - position))
+
+def write_arrays(path, arrays, meta, compression=None):
+    header = {"arrays": {}, "meta": meta}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset//alignment)*alignment
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    data = json.dumps(header).encode('utf-8')
+    start = -(-(len(magic) + 8 + len(data))//alignment)*alignment
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as file:
+            if compression:
+                image = io.BytesIO()
+                write_image(image, data, start, arrays, header, start + offset)
+                file.write(compress(image.getvalue(), compression))
+            else:
+                write_image(file, data, start, arrays, header, start + offset)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_head(path, n):
+    #the first n bytes of what open_buffer gives, decompressing no further than that
+    with open(path, 'rb') as file:
+        head = file.read(4)
+        file.seek(0)
+        if head.startswith(signatures['gzip']):
+            with gzip.GzipFile(fileobj=file, mode='rb') as stream:
+                return stream.read(n)
+        if head.startswith(signatures['zstd']):
+            import zstandard
+            with zstandard.ZstdDecompressor().stream_reader(file) as stream:
+                return stream.read(n)
+        return file.read(n)
+
+def open_buffer(path):
+    #the file mapped, or decompressed into memory if it was written compressed
+    with open(path, 'rb') as file:
+        head = file.read(4)
+        if not head:
+            return head
+        for compression, signature in signatures.items():
+            if head.startswith(signature):
+                return decompress(head + file.read(), compression)
+        #the arrays keep the mapping alive, closing the file does not unmap it
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read_arrays(path):
+    buffer = open_buffer(path)
+    if buffer[:len(magic)] != magic:
+        raise ValueError('{} is not a columnar file'.format(path))
+    n, = struct.unpack_from('<Q', buffer, len(magic))
+    header = json.loads(bytes(buffer[len(magic) + 8:len(magic) + 8 + n]).decode('utf-8'))
+    start = -(-(len(magic) + 8 + n)//alignment)*alignment
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start + spec["offset"]).reshape(spec["shape"])
+    return arrays, header["meta"]
+
+def read_csv(path, schema):
+    #parses a csv into the frame its loader hands out, checking it against the schema on the way.
+    #Types are 'category' (strings), 'date' (datetime.date), 'int32', 'int64', 'float64' and
+    #'float32', which is kept and stored as float64 but has to be held exactly by float32. A '*'
+    #entry takes every other column as pandas reads it, otherwise the csv must have exactly the
+    #schema's columns
+    columns = {c: t for c, t in schema.items() if c != '*'}
+    df = pd.read_csv(path, sep=",", dtype={c: str for c, t in columns.items() if t in ['category', 'date']})
+    missing = [c for c in columns if c not in df.columns]
+    extra = [c for c in df.columns if c not in columns]
+    if missing or (extra and '*' not in schema):
+        raise ValueError('{}: missing columns {}, unexpected columns {}'.format(path, missing, extra))
+    for c, t in columns.items():
+        try:
+            df[c] = convert_column(df[c], t)
+        except (ValueError, TypeError) as e:
+            raise ValueError('{}: column {} is not {}: {}'.format(path, c, t, e))
+    return df
+
+def convert_column(values, kind):
+    if kind == 'category':
+        return values
+    if kind == 'date':
+        return pd.to_datetime(values, format='%Y-%m-%d').dt.date
+    if values.dtype.kind not in 'iuf':
+        raise ValueError('not numeric')
+    if kind in ['int32', 'int64']:
+        if values.dtype.kind == 'f' or values.min() < np.iinfo(kind).min or values.max() > np.iinfo(kind).max:
+            raise ValueError('missing values, fractions or values out of range')
+        return values.astype(kind)
+    values = values.astype(np.float64)
+    if kind == 'float32' and not values.equals(widen(values.values.astype(np.float32))):
+        raise ValueError('values that float32 does not hold exactly')
+    return values
+
+def widen(values):
+    #float32 to the float64 the csv had, through the shortest decimal that reads back as the same float32
+    return pd.Series(np.array(values.astype(str), dtype=np.float64))
+
+def get_column_type(values, schema_type):
+    if schema_type is not None:
+        return schema_type
+    if values.dtype.kind in 'biuf':
+        return values.dtype.name
+    present = [v for v in values if not (isinstance(v, float) and np.isnan(v))]
+    if all(isinstance(v, str) for v in present):
+        return 'category'
+    if all(isinstance(v, datetime.date) and not isinstance(v, datetime.datetime) for v in present):
+        return 'date'
+    raise ValueError('Only numeric, string and date columns can be stored')
+
+def get_code_dtype(n):
+    #codes are signed, -1 stands for a missing value
+    return np.int8 if n < 2**7 else np.int16 if n < 2**15 else np.int32
+
+def write_frame(path, df, schema=None):
+    #columns the schema leaves out are stored as their values suggest
+    schema = schema or {}
+    arrays = {}
+    columns = []
+    blocks = {}
+    for i, name in enumerate(df.columns):
+        values = df[name].values
+        kind = get_column_type(values, schema.get(name))
+        if kind == 'category':
+            codes, dictionary = pd.factorize(values, sort=True)
+            arrays['codes{}'.format(i)] = codes.astype(get_code_dtype(len(dictionary)))
+            columns.append({"name": name, "array": 'codes{}'.format(i), "type": kind, "dictionary": list(dictionary)})
+        elif kind == 'date':
+            arrays['days{}'.format(i)] = pd.to_datetime(pd.Series(values)).values.astype('datetime64[D]')
+            columns.append({"name": name, "array": 'days{}'.format(i), "type": kind})
+        else:
+            #float32 columns keep the float64 values the csv had, the check was that float32 holds them
+            dtype = np.dtype(np.float64 if kind == 'float32' else kind).str
+            blocks.setdefault(dtype, []).append(values.astype(dtype))
+            columns.append({"name": name, "array": 'block' + dtype, "row": len(blocks[dtype]) - 1, "type": kind})
+    for dtype, block in blocks.items():
+        arrays['block' + dtype] = np.stack(block) if len(df) else np.empty((len(block), 0), dtype=dtype)
+    write_arrays(path, arrays, {"rows": len(df), "columns": columns})
+
+def read_column(column, arrays):
+    values = arrays[column["array"]]
+    if column["type"] == 'category':
+        #the stored codes over the header's dictionary, -1 is a missing value
+        return pd.Categorical.from_codes(values, column["dictionary"])
+    if column["type"] == 'date':
+        #one date object per distinct day
+        days, inverse = np.unique(values, return_inverse=True)
+        return days.astype(object)[inverse]
+    return values[column["row"]]
+
+def read_frame(path):
+    arrays, meta = read_arrays(path)
+    columns = meta["columns"]
+    #the largest block becomes the frame itself, without a copy, and the other columns are
+    #inserted around it
+    blocks = sorted({c["array"] for c in columns if "row" in c}, key=lambda a: arrays[a].shape[0], reverse=True)
+    if blocks:
+        base = [c for c in columns if c["array"] == blocks[0]]
+        df = pd.DataFrame(arrays[blocks[0]].T, columns=[c["name"] for c in base], copy=False)
+    else:
+        base = []
+        df = pd.DataFrame(index=pd.RangeIndex(meta["rows"]))
+    with warnings.catch_warnings():
+        #one block per inserted column is what keeps the views views, pandas warns past a hundred
+        warnings.simplefilter('ignore', PerformanceWarning)
+        for i, c in enumerate(columns):
+            if c not in base:
+                df.insert(i, c["name"], read_column(c, arrays))
+    return df
+
+def get_columnar_tables():
+    #every table the app maps, as the path of its columnar copy, its sources, how to parse them
+    #(checking them against their schema) and how to write what was parsed
+    from projections.utils import get_projections_tables
+    from ventilators.utils import get_ventilator_tables
+    from policies.scenarios import get_scenarios_tables
+    from dataset.utils import get_clinical_tables
+    return get_projections_tables() + get_ventilator_tables() + get_scenarios_tables() + get_clinical_tables()
+
+def build_columnar(force=True):
+    #writes the columnar copy of every table, or only the missing and outdated ones
+    built = []
+    for table in get_columnar_tables():
+        if force or not is_current(table["path"], table["sources"]):
+            table["write"](table["path"], table["parse"]())
+            built.append(table["path"])
+    return built
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the tables the app loads against their schemas and write their columnar copies.')
+    parser.add_argument('--check', action='store_true', help='only check the sources, write nothing')
+    args = parser.parse_args()
+    failed = 0
+    for table in get_columnar_tables():
+        try:
+            data = table["parse"]()
+        except ValueError as e:
+            print('failed: {}'.format(e))
+            failed += 1
+            continue
+        if args.check:
+            print('ok: {}'.format(', '.join(table["sources"])))
+        else:
+            table["write"](table["path"], data)
+            print('wrote {} ({:.0f} KB)'.format(table["path"], os.path.getsize(table["path"])/1024))
+    sys.exit(1 if failed else 0)
@@ -1,6 +1,4 @@
 ### Data
-import pandas as pd
-import urllib
 
 import dash_table
 import dash_core_components as dcc
@@ -10,21 +8,17 @@ import dash_bootstrap_components as dbc
 from navbar import Navbar
 from footer import Footer
 from assets.mappings import get_data_cols
+from dataset.utils import get_clinical_outcomes, get_clinical_outcomes_link, get_reference_ranges_link
 
 def Dataset():
 	nav = Navbar()
 	footer = Footer()
 
-	dataset = "data/clinical_outcomes_database.csv"
-	ref_data = "data/reference_ranges.csv"
 	demographics = ["Median Age", "% Male"]
-	ref = pd.read_csv(ref_data)
-	df = pd.read_csv(dataset)
+	df = get_clinical_outcomes()
 
-	data_csv_string = df.to_csv(index=False, encoding='utf-8')
-	data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(data_csv_string)
-	ref_data_csv_string = ref.to_csv(index=False, encoding='utf-8')
-	ref_data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(ref_data_csv_string)
+	data_csv_string = get_clinical_outcomes_link()
+	ref_data_csv_string = get_reference_ranges_link()
 
 	df = df.loc[:,get_data_cols()]
 	df = df.head(50)
@@ -0,0 +1,83 @@
+import os
+import threading
+
+from columnar import get_columnar_path, get_mtime, is_current, read_csv, read_frame, write_frame
+from downloads import get_download_url
+
+clinical_outcomes_path = 'data/clinical_outcomes_database.csv'
+reference_ranges_path = 'data/reference_ranges.csv'
+
+#the sheets gain columns as studies are added, so the schemas only pin down the columns the pages
+#rely on and take the others as pandas reads them (see columnar.read_csv)
+schemas = {
+    clinical_outcomes_path: {
+        'Country': 'category',
+        'Survivors': 'category',
+        'Study Pop Size (N)': 'float64',
+        '*': 'infer'
+    },
+    reference_ranges_path: {
+        'Lab Test': 'category',
+        'Reference Range': 'category',
+        '*': 'infer'
+    }
+}
+
+#the clinical tables are loaded once per process (before fork under gunicorn --preload) and again
+#when the csv or its columnar copy changes. The frames are shared, treat them as read-only.
+_tables = {}
+_tables_lock = threading.Lock()
+
+def read_table(path):
+    if is_current(get_columnar_path(path), [path]):
+        return read_frame(get_columnar_path(path))
+    return read_csv(path, schemas[path])
+
+def get_clinical_tables():
+    return [{
+        "path": get_columnar_path(path),
+        "sources": [path],
+        "parse": lambda path=path: read_csv(path, schemas[path]),
+        "write": lambda columnar_path, df, path=path: write_frame(columnar_path, df, schemas[path])
+    } for path in schemas]
+
+def get_table(path):
+    mtime = (os.path.getmtime(path), get_mtime(get_columnar_path(path)))
+    table = _tables.get(path)
+    if table is None or table[0] != mtime:
+        with _tables_lock:
+            table = _tables.get(path)
+            if table is None or table[0] != mtime:
+                table = (mtime, read_table(path))
+                _tables[path] = table
+    return table
+
+def get_clinical_outcomes():
+    return get_table(clinical_outcomes_path)[1]
+
+def get_clinical_outcomes_link():
+    return get_download_url('clinical_outcomes')
+
+def get_reference_ranges():
+    return get_table(reference_ranges_path)[1]
+
+def get_reference_ranges_link():
+    return get_download_url('reference_ranges')
+
+def get_clinical_downloads():
+    return [{
+        "name": name,
+        "filename": filename,
+        "sources": [path],
+        "frame": lambda path=path: get_table(path)[1]
+    } for name, filename, path in [
+        ('clinical_outcomes', 'covid_analytics_clinical_data', clinical_outcomes_path),
+        ('reference_ranges', 'covid_analytics_reference_ranges', reference_ranges_path)
+    ]]
+
+def get_clinical_version():
+    return (get_table(clinical_outcomes_path)[0], get_table(reference_ranges_path)[0])
+
+def load_clinical_tables():
+    get_table(clinical_outcomes_path)
+    get_table(reference_ranges_path)
@@ -0,0 +1,156 @@
+import os
+import io
+import gzip
+import argparse
+import datetime
+import threading
+import flask
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+from columnar import get_mtime
+
+#The tables the pages offer for download, served from /download/<name>?format=csv (csv by
+#default, json or parquet) instead of being embedded in the pages as data: urls. Each table is
+#written once per format under downloads_dir, gzip compressed except for parquet, which compresses
+#itself, and streamed from there by every worker. Responses carry an ETag and Last-Modified, so
+#browsers and proxies revalidate with a conditional GET instead of downloading again, and are sent
+#compressed to clients that accept gzip. A file is written again when it is older than its table's
+#sources. The warm-up writes the csv files, python -m downloads writes every format.
+downloads_dir = 'data/downloads'
+formats = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet'
+}
+compressed_formats = ['csv', 'json']
+chunk_size = 64*1024
+
+_downloads_lock = threading.Lock()
+
+def get_download_url(name, format='csv'):
+    if format == 'csv':
+        return '/download/{}'.format(name)
+    return '/download/{}?format={}'.format(name, format)
+
+def get_download_tables():
+    #every table offered, by name, with the file name it is saved as, its sources and its frame
+    from dataset.utils import get_clinical_downloads
+    from ventilators.utils import get_ventilator_downloads
+    return {table["name"]: table for table in get_clinical_downloads() + get_ventilator_downloads()}
+
+def get_download_path(name, format):
+    path = os.path.join(downloads_dir, '{}.{}'.format(name, format))
+    return path + '.gz' if format in compressed_formats else path
+
+def is_current(path, sources):
+    mtime = get_mtime(path)
+    return mtime is not None and all(mtime >= os.path.getmtime(source) for source in sources)
+
+def is_date_column(values):
+    present = values.dropna()
+    return values.dtype == object and len(present) > 0 and isinstance(present.iloc[0], datetime.date)
+
+def get_table_bytes(df, format):
+    if format == 'csv':
+        return df.to_csv(index=False, encoding='utf-8').encode('utf-8')
+    if format == 'json':
+        #dates as they are in the csv rather than as timestamps
+        dates = [c for c in df.columns if is_date_column(df[c])]
+        df = df.assign(**{c: df[c].map(lambda d: d.isoformat() if isinstance(d, datetime.date) else d) for c in dates})
+        return df.to_json(orient='records').encode('utf-8')
+    buffer = io.BytesIO()
+    #raises ImportError without pyarrow or fastparquet
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def write_download(path, data, compress):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as file:
+            if compress:
+                #no timestamp in the gzip header, the same table compresses to the same bytes
+                with gzip.GzipFile(fileobj=file, mode='wb', mtime=0) as gzip_file:
+                    gzip_file.write(data)
+            else:
+                file.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def build_download(table, format, force=False):
+    path = get_download_path(table["name"], format)
+    if force or not is_current(path, table["sources"]):
+        with _downloads_lock:
+            if force or not is_current(path, table["sources"]):
+                write_download(path, get_table_bytes(table["frame"](), format), format in compressed_formats)
+    return path
+
+def build_downloads(force=False):
+    #the csv files, the format the pages link to
+    return [build_download(table, 'csv', force) for table in get_download_tables().values()]
+
+def stream_gunzip(path):
+    with gzip.open(path, 'rb') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def send_download(path, format, filename):
+    stat = os.stat(path)
+    compressed = format in compressed_formats
+    send_compressed = compressed and flask.request.accept_encodings['gzip'] > 0
+    response = flask.Response(mimetype=formats[format])
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(filename, format)
+    #the compressed and uncompressed bytes are different representations and need different etags
+    response.set_etag('{:x}-{:x}{}'.format(int(stat.st_mtime*1000), stat.st_size, '-gzip' if send_compressed else ''))
+    last_modified = datetime.datetime.utcfromtimestamp(int(stat.st_mtime))
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    if compressed:
+        response.vary.add('Accept-Encoding')
+    if not is_resource_modified(flask.request.environ, etag=response.get_etag()[0], last_modified=last_modified):
+        response.status_code = 304
+        return response
+    if send_compressed:
+        response.content_encoding = 'gzip'
+    if compressed and not send_compressed:
+        response.response = stream_gunzip(path)
+    else:
+        response.response = wrap_file(flask.request.environ, open(path, 'rb'), chunk_size)
+        response.content_length = stat.st_size
+    response.direct_passthrough = True
+    return response
+
+def register_downloads(app):
+    @app.server.route('/download/<name>', methods=['GET'])
+    def download_table(name):
+        table = get_download_tables().get(name)
+        if table is None:
+            flask.abort(404)
+        format = flask.request.args.get('format', 'csv')
+        if format not in formats:
+            flask.abort(400, "format is one of {}.".format(', '.join(formats)))
+        try:
+            path = build_download(table, format)
+        except ImportError:
+            flask.abort(501, "Parquet downloads need pyarrow or fastparquet.")
+        return send_download(path, format, table["filename"])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the files the download links serve.')
+    parser.add_argument('--formats', nargs='+', default=list(formats), choices=list(formats))
+    args = parser.parse_args()
+    for table in get_download_tables().values():
+        for format in args.formats:
+            try:
+                path = build_download(table, format, force=True)
+            except ImportError as e:
+                print('skipped {} as {}: {}'.format(table["name"], format, e))
+                continue
+            print('wrote {} ({:.0f} KB)'.format(path, os.path.getsize(path)/1024))
@@ -6,21 +6,13 @@ import dash_bootstrap_components as dbc
 import flask
 import os
 
-from about_us.team import Team
-from about_us.press import Press
-from about_us.contact import Contact
-from about_us.collaborators import Collaborators
-from dataset.dataset import Dataset
-from dataset.dataset_documentation import Dataset_documentation
-from homepage import Homepage
-from interactive_graphs.interactive import InteractiveGraph
-from projections.projections import ProjectState
-from projections.projections_documentation import Projections_documentation
-from policies.main import Policies
-from risk_calculator.mortality.calculator import RiskCalc
-from risk_calculator.infection.calculator import InfectionRiskCalc
-from ventilators.allocations import VentilatorAllocations
-from financial.main import FinancialReliefPlanning
+import gc
+import importlib
+
+from projections.utils import load_projections
+from metrics import instrument_app
+from layout_cache import cached_layout, get_layout_cache_stats
+from downloads import register_downloads
 
 import callbacks_routers.ventilators as ventilators
 import callbacks_routers.insights as insights
@@ -37,6 +29,8 @@ app = dash.Dash(
         )
 
 server = app.server
+#before any callback is registered, so that all of them are timed
+instrument_app(app)
 app.title = "COVIDAnalytics"
 app.config.suppress_callback_exceptions = True
 external_stylesheets=[dbc.themes.BOOTSTRAP]
@@ -52,45 +46,88 @@ insights.register_callbacks(app)
 projections.register_callbacks(app)
 risk_calculators.register_callbacks(app)
 policies.register_callbacks(app)
+register_downloads(app)
+
+def warm_up():
+    #everything the callbacks read from disk, loaded here so that under gunicorn --preload it is
+    #loaded once, in the master, and the workers share its pages instead of each loading it
+    from ventilators.utils import load_ventilator_tables
+    from policies.scenarios import get_policy_scenarios
+    from dataset.utils import load_clinical_tables
+    from risk_calculator.models import load_model_bundles
+    from risk_calculator.utils import get_title_mapping, get_languages
+    from columnar import build_columnar
+    from downloads import build_downloads
+    try:
+        #before anything is loaded, so that the loaders map the columnar copies
+        build_columnar(force=False)
+    except (OSError, ValueError) as e:
+        print('Could not build the columnar tables, loading the csv and json files: {}'.format(e))
+    load_projections()
+    load_ventilator_tables()
+    get_policy_scenarios()
+    load_clinical_tables()
+    try:
+        build_downloads(force=False)
+    except OSError as e:
+        print('Could not write the download files: {}'.format(e))
+    load_model_bundles()
+    get_title_mapping()
+    get_languages()
+    #what is loaded by now lives as long as the process. Moving it out of the collector's reach
+    #keeps collections in the workers from writing to those pages and un-sharing them
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+#WARM_UP=0 skips it, for a quick start in development
+if os.environ.get('WARM_UP', '1') != '0':
+    warm_up()
 
 @app.server.route('/favicon.ico')
 def favicon():
     return flask.send_from_directory(os.path.join(app.server.root_path, 'static'),
                                      'favicon.ico', mimetype='image/x-icon')
 
+#page layouts by pathname, as (module, function, version). A page's module is imported the first
+#time the page is visited, so a worker only loads what it serves. version, a (module, function)
+#too, gives the version of the data the page is built from, its layout is cached until that
+#changes (see layout_cache.py). Pages that start from today's date have the day in their version
+projections_version = ('projections.utils', 'get_projections_version')
+pages = {
+    '/dataset': ('dataset.dataset', 'Dataset', ('dataset.utils', 'get_clinical_version')),
+    '/dataset_documentation': ('dataset.dataset_documentation', 'Dataset_documentation', None),
+    '/interactive-graph': ('interactive_graphs.interactive', 'InteractiveGraph', ('dataset.utils', 'get_clinical_version')),
+    '/projections': ('projections.projections', 'ProjectState', projections_version),
+    '/projections_documentation': ('projections.projections_documentation', 'Projections_documentation', None),
+    '/policies': ('policies.main', 'Policies', ('policies.scenarios', 'get_scenarios_version')),
+    '/ventilator_allocation': ('ventilators.allocations', 'VentilatorAllocations', ('ventilators.utils', 'get_ventilators_version')),
+    '/mortality_calculator': ('risk_calculator.mortality.calculator', 'RiskCalc', None),
+    '/infection_calculator': ('risk_calculator.infection.calculator', 'InfectionRiskCalc', None),
+    '/financial_relief': ('financial.main', 'FinancialReliefPlanning', None),
+    '/team': ('about_us.team', 'Team', None),
+    '/contact': ('about_us.contact', 'Contact', None),
+    '/press': ('about_us.press', 'Press', None),
+    '/collaborators': ('about_us.collaborators', 'Collaborators', None)
+}
+home_page = ('homepage', 'Homepage', projections_version)
+
+def call(module, name):
+    return getattr(importlib.import_module(module), name)()
+
+def get_page_layout(pathname):
+    #cached by page rather than by pathname, unknown pathnames all get the home page
+    module, name, version = pages.get(pathname, home_page)
+    return cached_layout((module, name), call(*version) if version else None, lambda: call(module, name))
+
+@app.server.route('/layout_cache', methods=['GET'])
+def layout_cache_stats():
+    return flask.jsonify(get_layout_cache_stats())
+
 # redirects to different pages
 @app.callback(Output('page-content', 'children'),[Input('url', 'pathname')])
 def display_page(pathname):
-    if pathname == '/dataset':
-        return Dataset()
-    if pathname == '/dataset_documentation':
-        return Dataset_documentation()
-    if pathname == '/interactive-graph':
-        return InteractiveGraph()
-    if pathname == '/projections':
-        return ProjectState()
-    if pathname == '/projections_documentation':
-        return Projections_documentation()
-    if pathname == '/policies':
-        return Policies()
-    if pathname == '/ventilator_allocation':
-        return VentilatorAllocations()
-    if pathname == '/mortality_calculator':
-        return RiskCalc()
-    if pathname == '/infection_calculator':
-        return InfectionRiskCalc()
-    if pathname == '/financial_relief':
-        return FinancialReliefPlanning()
-    if pathname == '/team':
-        return Team()
-    if pathname == '/contact':
-        return Contact()
-    if pathname == '/press':
-        return Press()
-    if pathname == '/collaborators':
-        return Collaborators()
-    else:
-        return Homepage()
+    return get_page_layout(pathname)
 
 #Callbacks for navbar
 @app.callback(
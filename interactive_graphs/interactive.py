@@ -1,5 +1,3 @@
-import pandas as pd
-import urllib
 import plotly.graph_objects as go
 from textwrap import wrap
 import dash_core_components as dcc
@@ -9,11 +7,11 @@ import dash_bootstrap_components as dbc
 from navbar import Navbar
 from footer import Footer
 from assets.mappings import get_colors
+from dataset.utils import get_clinical_outcomes, get_clinical_outcomes_link
 
 def InteractiveGraph():
-    df = pd.read_csv('data/clinical_outcomes_database.csv')
-    data_csv_string = df.to_csv(index=False, encoding='utf-8')
-    data_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(data_csv_string)
+    df = get_clinical_outcomes()
+    data_csv_string = get_clinical_outcomes_link()
 
     nav = Navbar()
     footer = Footer()
@@ -170,7 +168,7 @@ def get_lb(ind,buckets):
 
 
 def build_graph(y_title,x_title,survivor_vals):
-    df = pd.read_csv('data/clinical_outcomes_database.csv')
+    df = get_clinical_outcomes()
     if y_title not in df.columns or x_title not in df.columns:
         return None
     cols = [x_title,y_title] + ["Survivors","Country"]
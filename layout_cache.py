@@ -0,0 +1,45 @@
+import os
+import json
+import time
+
+from plotly.utils import PlotlyJSONEncoder
+
+from sized_lru import SizedLRU
+
+#Page layouts as the json display_page sends, built once per process and kept by page together
+#with the version of the data the page is built from (see pages in index.py). A layout is built
+#again when that data changes, when the day changes for pages whose version includes the day,
+#and at the latest layout_max_age seconds after it was built, for anything else a page reads
+#while it is built. LAYOUT_MAX_AGE=0 builds every layout on every visit.
+#The layouts handed out are shared between requests, treat them as read-only.
+layout_max_age = float(os.environ.get('LAYOUT_MAX_AGE', 3600))
+
+#a handful of pages, the bounds only keep a runaway page from taking the process with it
+max_entries = 1024
+max_bytes = 64*1024*1024
+
+_layouts = SizedLRU(max_entries, max_bytes)
+
+def clear_layout_cache():
+    _layouts.clear()
+
+def cached_layout(page, version, build):
+    now = time.monotonic()
+    entry = _layouts.get(page, lambda entry: entry[0] == version and now - entry[1] < layout_max_age)
+    if entry is not None:
+        return entry[2]
+    #built outside the lock, a slow page does not hold up the others
+    layout_json = json.dumps(build(), cls=PlotlyJSONEncoder)
+    layout = json.loads(layout_json)
+    _layouts.put(page, (version, now, layout), len(layout_json))
+    return layout
+
+def get_layout_cache_stats():
+    now = time.monotonic()
+    stats = _layouts.stats()
+    return {
+        'pages': {'.'.join(page): {'version': str(version), 'age': now - built} for page, (version, built, _) in _layouts.items()},
+        'max_age': layout_max_age,
+        'hits': stats['hits'],
+        'misses': stats['misses']
+    }
@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+import functools
+import flask
+from dash.exceptions import PreventUpdate
+
+#Latency and response size of every Dash callback, kept in histograms in each process and served
+#at /metrics in the Prometheus text format. A callback's time is split into the time spent
+#building plotly objects, the rest of the callback (the data work, pandas for the most part) and
+#turning its result into the json response. Every gunicorn worker keeps its own histograms and
+#labels them with its pid, so a scraper gets the worker that answered and series do not mix.
+#Set METRICS=0 to leave the callbacks as they are.
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+size_buckets = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+#the plotly classes and figure methods the app builds its figures with
+plotly_classes = ['Figure', 'Scatter', 'Choropleth']
+figure_methods = ['add_trace', 'add_traces', 'update_layout', 'update_traces', 'update_xaxes', 'update_yaxes', 'update_geos']
+
+descriptions = {
+    'dash_callback_seconds': ('histogram', 'Time spent in Dash callbacks by phase: data, plotly, serialize and their total.'),
+    'dash_callback_response_bytes': ('histogram', 'Size of the json responses of Dash callbacks.'),
+    'dash_callback_calls_total': ('counter', 'Dash callback calls by outcome: ok, prevented (PreventUpdate) or error.')
+}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+#time spent in plotly by the callback running on this thread
+_local = threading.local()
+
+def observe(name, labels, value, buckets):
+    key = (name, labels)
+    with _metrics_lock:
+        histogram = _metrics.get(key)
+        if histogram is None:
+            histogram = _metrics[key] = {"buckets": buckets, "counts": [0]*len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def increment(name, labels):
+    with _metrics_lock:
+        _metrics[(name, labels)] = _metrics.get((name, labels), 0) + 1
+
+def timed_plotly(method):
+    @functools.wraps(method)
+    def run(*args, **kwargs):
+        #only the outermost call counts, figures build their traces and layout through the same methods
+        if getattr(_local, 'plotly', None) is None or _local.depth:
+            return method(*args, **kwargs)
+        _local.depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _local.depth -= 1
+            _local.plotly += time.perf_counter() - start
+    return run
+
+def instrument_plotly():
+    import plotly.graph_objects as go
+    for name in plotly_classes:
+        cls = getattr(go, name)
+        cls.__init__ = timed_plotly(cls.__init__)
+    for name in figure_methods:
+        setattr(go.Figure, name, timed_plotly(getattr(go.Figure, name)))
+
+def record_callback(name, outcome, total, func_time, plotly_time, response):
+    pid = str(os.getpid())
+    increment('dash_callback_calls_total', (('callback', name), ('outcome', outcome), ('pid', pid)))
+    observe('dash_callback_seconds', (('callback', name), ('phase', 'total'), ('pid', pid)), total, latency_buckets)
+    if outcome != 'ok':
+        return
+    phases = [('data', func_time - plotly_time), ('plotly', plotly_time), ('serialize', total - func_time)]
+    for phase, seconds in phases:
+        observe('dash_callback_seconds', (('callback', name), ('phase', phase), ('pid', pid)), seconds, latency_buckets)
+    observe('dash_callback_response_bytes', (('callback', name), ('pid', pid)), len(response), size_buckets)
+
+def instrument_callback(callback_map, name, func, wrap_func):
+    #wrap_func is what app.callback returns: it wraps func in Dash's add_context, which validates
+    #and serializes func's result, and registers that
+    @functools.wraps(func)
+    def timed_func(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.func = time.perf_counter() - start
+
+    add_context = wrap_func(timed_func)
+
+    @functools.wraps(add_context)
+    def timed_callback(*args, **kwargs):
+        _local.plotly, _local.depth, _local.func = 0.0, 0, 0.0
+        start = time.perf_counter()
+        outcome = 'error'
+        response = ''
+        try:
+            response = add_context(*args, **kwargs)
+            outcome = 'ok'
+            return response
+        except PreventUpdate:
+            outcome = 'prevented'
+            raise
+        finally:
+            total = time.perf_counter() - start
+            plotly_time = _local.plotly
+            _local.plotly = None
+            record_callback(name, outcome, total, _local.func, plotly_time, response)
+
+    #dispatch looks the callback up in callback_map, where wrap_func has just put add_context
+    for entry in callback_map.values():
+        if entry["callback"] is add_context:
+            entry["callback"] = timed_callback
+    return timed_callback
+
+def instrument_app(app):
+    #call before any callback is registered
+    if os.environ.get('METRICS', '1') == '0':
+        return
+    instrument_plotly()
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        wrap_func = register(*args, **kwargs)
+        def decorator(func):
+            name = '{}.{}'.format(func.__module__.split('.')[-1], func.__name__)
+            return instrument_callback(app.callback_map, name, func, wrap_func)
+        return decorator
+    app.callback = callback
+
+    @app.server.route('/metrics', methods=['GET'])
+    def metrics():
+        return flask.Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def format_labels(labels):
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+    return '{' + ','.join('{}="{}"'.format(k, v) for k, v in escaped) + '}'
+
+def render_metrics():
+    with _metrics_lock:
+        metrics = sorted((key, dict(value, counts=list(value["counts"])) if isinstance(value, dict) else value) for key, value in _metrics.items())
+    lines = []
+    for name, (kind, description) in descriptions.items():
+        lines += ['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, kind)]
+        for (metric, labels), value in metrics:
+            if metric != name:
+                continue
+            if kind == 'counter':
+                lines.append('{}{} {}'.format(name, format_labels(labels), value))
+                continue
+            for bound, count in zip(value["buckets"], value["counts"]):
+                lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', repr(float(bound))),)), count))
+            lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', '+Inf'),)), value["count"]))
+            lines.append('{}_sum{} {!r}'.format(name, format_labels(labels), value["sum"]))
+            lines.append('{}_count{} {}'.format(name, format_labels(labels), value["count"]))
+    return '\n'.join(lines) + '\n'
@@ -1,4 +1,3 @@
-import json
 import plotly.graph_objects as go
 from textwrap import wrap
 import math
@@ -12,6 +11,7 @@ from footer import Footer
 
 from policies.cards import get_state_num_policy_card, get_policy_cards, get_colors
 from policies.graphs import get_projections, map_policy, no_policy_chosen, get_start
+from policies.scenarios import get_policy_scenarios
 
 def get_num_policies():
     return 3
@@ -20,10 +20,7 @@ def Policies():
     nav = Navbar()
     footer = Footer()
 
-    with open('assets/policies/US_Scenarios.json', 'rb') as file:
-        projections = json.load(file)
-
-    states = list(projections.keys())
+    states = list(get_policy_scenarios()["states"])
     num_policies = get_num_policies()
 
     body = dbc.Container(
@@ -88,21 +85,22 @@ def build_policy_projections(state, policies, times, value):
     if no_policy_chosen(policies):
         return
 
-    with open('assets/policies/US_Scenarios.json', 'rb') as file:
-        projections = json.load(file)
+    cube = get_policy_scenarios()
 
     colors = get_colors()
     fig = go.Figure()
 
-    data = projections[state]
-    x = data["Day"]
+    s = cube["states"][state]
+    m = cube["metrics"][value]
+    start, stop = cube["starts"][s], cube["stops"][s]
+    x = cube["days"][start:stop]
     max_y = 0
     for p,policy in enumerate(policies):
         if sum(policy) > 0:
             name = map_policy(policy)
             code = name_to_json[name]
             t = map_time[times[p]]
-            y = data[code][t][value]
+            y = cube["series"][s, cube["policies"][code], cube["times"][t], m, start:stop]
             fig.add_trace(go.Scatter(
                 name='<br>'.join(wrap(name + "," + str(t), width=60)),
                 showlegend=True,
@@ -112,7 +110,7 @@ def build_policy_projections(state, policies, times, value):
                 marker=dict(color=colors[p]),
                 line=dict(color=colors[p],width=4)
             ))
-            temp = max(data[code][t][value])
+            temp = y.max()
             if temp > max_y:
                 max_y = int(math.ceil(temp / 100000.0)) * 100000
 
@@ -127,11 +125,7 @@ def build_policy_projections(state, policies, times, value):
                 line=dict(color=colors[p], width=1, dash='dash'),
                 marker=dict(color=colors[p], size=1)
             ))
-    i= 0
-    y = []
-    while not math.isnan(data[value + " True"][i]):
-        y.append(data[value + " True"][i])
-        i+=1
+    y = cube["truth"][s, m, start:cube["truth_stops"][s, m]]
     x = x[:len(y)]
 
     fig.add_trace(go.Scatter(
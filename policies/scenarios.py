@@ -0,0 +1,122 @@
+import os
+import json
+import argparse
+import threading
+from types import MappingProxyType
+import numpy as np
+
+from columnar import get_columnar_path, get_mtime, is_current, read_arrays, write_arrays
+
+scenarios_path = 'assets/policies/US_Scenarios.json'
+scenarios_columnar_path = get_columnar_path(scenarios_path)
+
+#the scenarios are loaded once per process (before fork under gunicorn --preload) and again when
+#the json, or its columnar copy, changes on disk, into a cube rather than the json's nested lists.
+#Every state's days are a run of the one date axis in days, from starts[state] to stops[state].
+#series holds every projection, indexed by (state, policy, start time, metric, day) and truth the
+#reported counts by (state, metric, day), both on that axis and padded outside the state's run
+#(the truth past truth_stops[state, metric], where it stops being reported). states, policies,
+#times and metrics map the json's keys to their index, they are kept once in the header of the
+#columnar copy rather than with every series. Projections are stored as int32 and the truth as
+#float32, both checked to hold every value exactly. Every array is read-only, and in the columnar
+#copy a view of the mapping, so workers share them page for page.
+#python -m policies.scenarios writes the columnar copy, compressed if asked (see columnar.py).
+_scenarios = {
+    'mtime': None,
+    'projections': None
+}
+_scenarios_lock = threading.Lock()
+
+cube_labels = ['states', 'policies', 'times', 'metrics']
+
+def build_scenario_cube(scenarios, path=scenarios_path):
+    states = list(scenarios)
+    first = scenarios[states[0]]
+    policies = [k for k, v in first.items() if isinstance(v, dict)]
+    times = list(first[policies[0]])
+    metrics = list(first[policies[0]][times[0]])
+    state_days = [np.array(scenarios[state]["Day"], dtype='datetime64[D]') for state in states]
+    if any((np.diff(run) != np.timedelta64(1, 'D')).any() for run in state_days):
+        raise ValueError('{}: the days of a state are not consecutive'.format(path))
+    first_day = min(run[0] for run in state_days)
+    days = np.arange(first_day, max(run[-1] for run in state_days) + 1)
+    starts = np.array([(run[0] - first_day).astype(int) for run in state_days], dtype=np.int32)
+    stops = starts + np.array([len(run) for run in state_days], dtype=np.int32)
+    series = np.zeros((len(states), len(policies), len(times), len(metrics), len(days)), dtype=np.int32)
+    truth = np.full((len(states), len(metrics), len(days)), np.nan, dtype=np.float32)
+    for i, state in enumerate(states):
+        data = scenarios[state]
+        run = slice(starts[i], stops[i])
+        for j, metric in enumerate(metrics):
+            values = np.array(data[metric + " True"], dtype=np.float64)
+            if len(values) != stops[i] - starts[i] or not np.array_equal(values.astype(np.float32), values, equal_nan=True):
+                raise ValueError('{}: {} {} True is not one float32 per day'.format(path, state, metric))
+            truth[i, j, run] = values
+            for p, policy in enumerate(policies):
+                for t, time in enumerate(times):
+                    values = np.array(data[policy][time][metric])
+                    if values.dtype.kind != 'i' or len(values) != stops[i] - starts[i] or \
+                            values.min() < np.iinfo(np.int32).min or values.max() > np.iinfo(np.int32).max:
+                        raise ValueError('{}: {} {} {} {} is not one int32 per day'.format(path, state, policy, time, metric))
+                    series[i, p, t, j, run] = values
+    #the truth is reported up to its first nan
+    missing = np.isnan(truth) & (np.arange(len(days)) >= starts[:, None, None])
+    truth_stops = np.where(missing.any(axis=2), missing.argmax(axis=2), len(days))
+    arrays = {"days": days, "starts": starts, "stops": stops, "series": series, "truth": truth, "truth_stops": truth_stops.astype(np.int32)}
+    return arrays, {"states": states, "policies": policies, "times": times, "metrics": metrics}
+
+def make_scenario_cube(arrays, labels):
+    cube = dict(arrays)
+    #the dates as the strings the figures have always been given
+    cube["days"] = np.datetime_as_string(arrays["days"], unit='D').astype('<U10')
+    for values in cube.values():
+        values.setflags(write=False)
+    for name in cube_labels:
+        cube[name] = MappingProxyType({label: i for i, label in enumerate(labels[name])})
+    return MappingProxyType(cube)
+
+def parse_policy_scenarios(path=scenarios_path):
+    with open(path, 'rb') as file:
+        return build_scenario_cube(json.load(file), path)
+
+def read_policy_scenarios():
+    if is_current(scenarios_columnar_path, [scenarios_path]):
+        return make_scenario_cube(*read_arrays(scenarios_columnar_path))
+    return make_scenario_cube(*parse_policy_scenarios())
+
+def write_policy_scenarios(path, cube, compression=None):
+    arrays, labels = cube
+    write_arrays(path, arrays, labels, compression)
+
+def get_scenarios_tables():
+    return [{
+        "path": scenarios_columnar_path,
+        "sources": [scenarios_path],
+        "parse": parse_policy_scenarios,
+        "write": write_policy_scenarios
+    }]
+
+def get_policy_scenarios():
+    mtime = (os.path.getmtime(scenarios_path), get_mtime(scenarios_columnar_path))
+    if _scenarios['mtime'] != mtime:
+        with _scenarios_lock:
+            if _scenarios['mtime'] != mtime:
+                _scenarios['projections'] = read_policy_scenarios()
+                _scenarios['mtime'] = mtime
+    return _scenarios['projections']
+
+def get_scenarios_version():
+    get_policy_scenarios()
+    return _scenarios['mtime']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the policy scenarios json to the columnar file the app loads.')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='a smaller file, read into memory instead of mapped')
+    parser.add_argument('--output', default=scenarios_columnar_path)
+    args = parser.parse_args()
+    try:
+        write_policy_scenarios(args.output, parse_policy_scenarios(), args.compress)
+    except ImportError:
+        parser.error('--compress zstd needs the zstandard package')
+    print('wrote {} ({:.0f} KB, the json is {:.0f} KB)'.format(
+        args.output, os.path.getsize(args.output)/1024, os.path.getsize(scenarios_path)/1024))
@@ -0,0 +1,56 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+
+from projections.utils import get_projections_signature
+
+#read side of the figure bundle written by projections/precompute.py
+bundle_path = 'data/predicted/projection_figures.sqlite'
+
+_bundle = {
+    'conn': None,
+    'mtime': None,
+    'pid': None,
+    'signature': None
+}
+_bundle_lock = threading.Lock()
+
+def bundle_key(key):
+    return json.dumps(key, default=str)
+
+def open_bundle():
+    try:
+        mtime = os.path.getmtime(bundle_path)
+    except OSError:
+        return None
+    #the bundle is swapped atomically on rebuild, and connections must not cross a fork
+    if _bundle['mtime'] != mtime or _bundle['pid'] != os.getpid():
+        if _bundle['conn'] is not None and _bundle['pid'] == os.getpid():
+            _bundle['conn'].close()
+        conn = sqlite3.connect('file:{}?mode=ro'.format(bundle_path), uri=True, check_same_thread=False)
+        meta = dict(conn.execute('SELECT key, value FROM meta').fetchall())
+        _bundle['conn'] = conn
+        _bundle['mtime'] = mtime
+        _bundle['pid'] = os.getpid()
+        _bundle['signature'] = (meta.get('digest'), meta.get('day'))
+    return _bundle['conn']
+
+def get_bundle_figure_json(key):
+    signature = get_projections_signature()
+    with _bundle_lock:
+        conn = open_bundle()
+        #a bundle built from other data or for another day is ignored
+        if conn is None or _bundle['signature'] != signature:
+            return None
+        row = conn.execute('SELECT figure FROM figures WHERE key = ?', (bundle_key(key),)).fetchone()
+    if row is None:
+        return None
+    return zlib.decompress(row[0]).decode('utf-8')
+
+def get_bundle_figure(key):
+    fig_json = get_bundle_figure_json(key)
+    if fig_json is None:
+        return None
+    return json.loads(fig_json)
@@ -0,0 +1,43 @@
+import json
+
+from projections.utils import get_projections_version
+from projections.bundle import get_bundle_figure_json
+from sized_lru import SizedLRU
+
+#bounded LRU of serialized figures, keyed on the inputs of the map builders.
+#Entries are figure json strings so the budget below is close to real memory use.
+max_entries = 1024
+max_bytes = 64*1024*1024
+
+_cache = SizedLRU(max_entries, max_bytes)
+_cache_state = {
+    'version': None
+}
+
+def clear_figure_cache(version=None):
+    _cache.clear()
+    _cache_state['version'] = version
+
+def get_cached_figure(key, version):
+    return _cache.get((version, key))
+
+def cache_figure(key, version, fig_json):
+    if _cache_state['version'] != version:
+        #projection data changed, everything cached so far is stale
+        clear_figure_cache(version)
+    _cache.put((version, key), fig_json, len(fig_json))
+
+def cached_figure(key, build):
+    version = get_projections_version()
+    fig_json = get_cached_figure(key, version)
+    if fig_json is None:
+        fig_json = get_bundle_figure_json(key)
+        if fig_json is None:
+            fig_json = build().to_json()
+        cache_figure(key, version, fig_json)
+    return json.loads(fig_json)
+
+def get_figure_cache_stats():
+    stats = _cache.stats()
+    stats['version'] = str(_cache_state['version'])
+    return stats
@@ -4,10 +4,10 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 
-from projections.utils import get_cols, get_df_us, build_card, add_cases
+from projections.utils import get_cols, get_df_us, build_card, add_cases, get_map_locations
 
 def get_top_visual():
-    map_locations = ['US', "Europe", "Asia", "North America", "South America", "Africa", 'World']
+    map_locations = get_map_locations()
     cols = get_cols()
     oneWeekFromNow = datetime.date.today() + datetime.timedelta(days=7)
     df_us = get_df_us()
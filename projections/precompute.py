@@ -0,0 +1,92 @@
+import os
+import time
+import zlib
+import sqlite3
+import argparse
+from multiprocessing import Pool
+
+from projections.utils import load_projections, get_projections_index, get_projections_signature
+from projections.utils import get_cols, get_map_locations, get_country_options, get_province_options, get_countries_with_provinces
+from projections.visuals_funcs import build_us_map_figure, build_continent_map_figure, build_state_projection_figure
+from projections.bundle import bundle_path, bundle_key
+
+#Renders every projections page figure for today's data into the bundle read by
+#projections/bundle.py. Run from the repository root after the DELPHI csvs are updated:
+#    python -m projections.precompute
+
+def get_map_keys():
+    index = get_projections_index()
+    map_locations = get_map_locations()
+    keys = []
+    for scope, day in index['cross_sections']:
+        if scope not in map_locations:
+            continue
+        for val in get_cols():
+            for pop in [1, 2]:
+                if scope == 'US':
+                    keys.append(('us', day, val, pop))
+                else:
+                    keys.append(('continent', day, val, scope, pop))
+    return keys
+
+def get_timeline_keys():
+    keys = []
+    for continent in get_map_locations():
+        countries = ['US'] if continent == 'US' else get_country_options(continent)
+        for country in ['None'] + countries:
+            states = get_province_options(country) if country in get_countries_with_provinces() else []
+            for state in dict.fromkeys(['None'] + states):
+                keys.append(('timeline', state, country, continent))
+    return keys
+
+def render_figure(key):
+    if key[0] == 'us':
+        fig = build_us_map_figure(*key[1:])
+    elif key[0] == 'continent':
+        fig = build_continent_map_figure(*key[1:])
+    else:
+        fig = build_state_projection_figure(*key[1:], list(get_cols()))
+    fig_json = fig.to_json().encode('utf-8')
+    return bundle_key(key), zlib.compress(fig_json, 9), len(fig_json)
+
+def build_bundle(output=bundle_path, processes=None):
+    start = time.time()
+    load_projections()
+    digest, day = get_projections_signature()
+    keys = get_map_keys() + get_timeline_keys()
+
+    tmp_path = output + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute('CREATE TABLE figures (key TEXT PRIMARY KEY, figure BLOB)')
+    conn.executemany('INSERT INTO meta VALUES (?, ?)', [('digest', digest), ('day', day)])
+
+    raw_bytes = 0
+    #workers are forked after the projections are loaded and inherit them
+    with Pool(processes) as pool:
+        for k, blob, size in pool.imap_unordered(render_figure, keys, chunksize=16):
+            conn.execute('INSERT INTO figures VALUES (?, ?)', (k, blob))
+            raw_bytes += size
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, output)
+
+    return {
+        'figures': len(keys),
+        'seconds': time.time() - start,
+        'raw_bytes': raw_bytes,
+        'bundle_bytes': os.path.getsize(output)
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the projections page figures.')
+    parser.add_argument('--output', default=bundle_path)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    report = build_bundle(args.output, args.processes)
+    print('Rendered {} figures in {:.1f}s'.format(report['figures'], report['seconds']))
+    print('Bundle {}: {:.1f} MB ({:.1f} MB of figure json)'.format(
+        args.output, report['bundle_bytes']/1e6, report['raw_bytes']/1e6))
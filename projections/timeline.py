@@ -4,10 +4,9 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 
-from projections.utils import get_df_projections, get_cols, add_cases
+from projections.utils import get_country_options, get_cols, add_cases
 
 def get_bottom_visual():
-    df_projections = get_df_projections()
     cols = get_cols()
 
     bottom_visual = \
@@ -78,7 +77,7 @@ def get_bottom_visual():
                                                     [
                                                     dcc.Dropdown(
                                                             id = 'country_dropdown',
-                                                            options = [{'label': x, 'value': x} for x in df_projections[df_projections['Continent'] == 'North America'].Country.unique()],
+                                                            options = [{'label': x, 'value': x} for x in get_country_options('North America')],
                                                     ),
 
                                                     dcc.Dropdown(
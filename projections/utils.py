@@ -1,17 +1,217 @@
-import pandas as pd
+import os
+import datetime
+import hashlib
+import threading
+import numpy as np
 
 import dash_bootstrap_components as dbc
 
+from columnar import get_columnar_path, get_mtime, is_current, read_csv, read_frame, write_frame
+
+projections_path = 'data/predicted/Global.csv'
+population_path = 'data/predicted/WorldPopulationInformation.csv'
+#the joined and sorted table, mapped instead of rebuilt when it is newer than both csvs
+projections_columnar_path = get_columnar_path(projections_path)
+location_cols = ['Continent', 'Country', 'Province']
+
+#what the csvs must hold, checked when they are parsed (see columnar.read_csv)
+projections_schema = {
+    'Continent': 'category',
+    'Country': 'category',
+    'Province': 'category',
+    'Day': 'date',
+    'Total Detected': 'int32',
+    'Active': 'int32',
+    'Active Hospitalized': 'int32',
+    'Cumulative Hospitalized': 'int32',
+    'Total Detected Deaths': 'int32',
+    'Active Ventilated': 'int32'
+}
+population_schema = {
+    'Unnamed: 0': 'int32',
+    'Continent': 'category',
+    'Country': 'category',
+    'Province': 'category',
+    'pop': 'int64'
+}
+
+#process-wide projection store: loaded once per worker (before fork under
+#gunicorn --preload), again when the csvs or their columnar copy change on disk,
+#and re-cut when the day rolls over. The frames it hands out are shared, treat
+#them as read-only.
+_store = {
+    'mtime': None,
+    'day': None,
+    'df_all': None,
+    'view': None,
+    'digest': None,
+    'version': 0
+}
+_store_lock = threading.Lock()
+
+def file_digest(paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def read_population():
+    df_pop = read_csv(population_path, population_schema)
+    #continent and world totals are keyed by Continent, only countries and provinces are joined
+    df_pop = df_pop.loc[df_pop.Country != 'None', ['Country', 'Province', 'pop']]
+    return df_pop.rename(columns={'pop': 'Population'})
+
+def parse_projections():
+    df_projections = read_csv(projections_path, projections_schema)
+    df_projections = df_projections.merge(read_population(), on=['Country', 'Province'], how='left')
+    for c in get_cols():
+        #counts are int32, a million times them is worked out in float64
+        df_projections[c + ' Per Million'] = np.round(1000000.0*df_projections[c]/df_projections['Population'], decimals = 2)
+    #keep every location's time series contiguous and in date order
+    df_projections = df_projections.sort_values(location_cols + ['Day'], kind='mergesort')
+    return df_projections.reset_index(drop=True)
+
+def read_projections():
+    if is_current(projections_columnar_path, [projections_path, population_path]):
+        return read_frame(projections_columnar_path)
+    return parse_projections()
+
+def get_projections_tables():
+    return [{
+        "path": projections_columnar_path,
+        "sources": [projections_path, population_path],
+        "parse": parse_projections,
+        "write": lambda path, df: write_frame(path, df, projections_schema)
+    }]
+
+def unique_list(values):
+    return list(dict.fromkeys(values))
+
+def build_projections_index(df):
+    keys = list(zip(*[df[c].values for c in location_cols]))
+    locations = {}
+    places = {}
+    start = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            locations[keys[start]] = (start, i)
+            places.setdefault(keys[start][1:], []).append(keys[start])
+            start = i
+
+    country_level = (df.Province == 'None') & (df.Country != 'None')
+    scopes = {
+        'World': country_level.values,
+        'US': ((df.Country == 'US') & (df.Province != 'None')).values,
+    }
+    for continent in df.Continent.unique():
+        if continent != 'None':
+            scopes[continent] = (country_level & (df.Continent == continent)).values
+    cross_sections = {}
+    for day, rows in df.groupby('Day', sort=True).indices.items():
+        for scope, mask in scopes.items():
+            cross_sections[(scope, day)] = rows[mask[rows]]
+
+    countries = {'World': unique_list(k[1] for k in locations if k[0] != 'None' and k[1] != 'None')}
+    provinces = {}
+    for continent, country, province in locations:
+        if country != 'None':
+            countries.setdefault(continent, [])
+            if country not in countries[continent]:
+                countries[continent].append(country)
+        provinces.setdefault(country, [])
+        if province not in provinces[country]:
+            provinces[country].append(province)
+
+    return {
+        'locations': locations,
+        'places': places,
+        'days': df['Day'].values.astype('datetime64[D]'),
+        'cross_sections': cross_sections,
+        'countries': countries,
+        'provinces': provinces
+    }
+
+def load_projections():
+    mtime = (os.path.getmtime(projections_path), os.path.getmtime(population_path), get_mtime(projections_columnar_path))
+    today = datetime.date.today()
+    view = _store['view']
+    if _store['mtime'] == mtime and _store['day'] == today:
+        return view
+    with _store_lock:
+        if _store['mtime'] != mtime:
+            _store['df_all'] = read_projections()
+            _store['digest'] = file_digest([projections_path, population_path])
+            _store['mtime'] = mtime
+            _store['day'] = None
+            _store['version'] += 1
+        if _store['day'] != today:
+            df_all = _store['df_all']
+            df = df_all.loc[df_all['Day'] >= today].reset_index(drop=True)
+            _store['view'] = (df, build_projections_index(df), (_store['version'], today))
+            _store['day'] = today
+        return _store['view']
+
+def get_projections_version():
+    return load_projections()[2]
+
+#identifies the data behind the current view across processes, unlike the version counter
+def get_projections_signature():
+    _, _, (_, today) = load_projections()
+    return (_store['digest'], today.isoformat())
+
 def get_df_projections():
-    df_projections = pd.read_csv('data/predicted/Global.csv', sep=",", parse_dates = ['Day'])
-    df_projections.loc[:,'Day'] = pd.to_datetime(df_projections['Day'], format='y%m%d').dt.date
-    today = pd.Timestamp('today')
-    df_projections = df_projections.loc[df_projections['Day']>=today]
-    return df_projections
+    return load_projections()[0]
+
+def get_projections_index():
+    return load_projections()[1]
+
+def take_locations(df, index, keys):
+    slices = [index['locations'][k] for k in keys if k in index['locations']]
+    if len(slices) == 1:
+        return df.iloc[slices[0][0]:slices[0][1]]
+    return df.take(np.concatenate([np.arange(start, stop) for start, stop in slices] + [np.array([], dtype=int)]))
+
+def get_location_keys(index, country, province, continent=None):
+    if continent is not None:
+        return [(continent, country, province)]
+    return index['places'].get((country, province), [])
+
+def get_location_projections(country, province, continent=None):
+    df, index, _ = load_projections()
+    return take_locations(df, index, get_location_keys(index, country, province, continent))
+
+def get_location_row(country, province, continent, day):
+    df, index, _ = load_projections()
+    day = np.datetime64(day, 'D')
+    for k in get_location_keys(index, country, province, continent):
+        if k not in index['locations']:
+            continue
+        start, stop = index['locations'][k]
+        i = start + np.searchsorted(index['days'][start:stop], day)
+        if i < stop and index['days'][i] == day:
+            return df.iloc[i]
+    return None
+
+def get_projection_cross_section(day, scope):
+    df, index, _ = load_projections()
+    return df.take(index['cross_sections'].get((scope, day), np.array([], dtype=int)))
+
+def get_country_options(scope):
+    return get_projections_index()['countries'].get(scope, [])
+
+def get_province_options(country):
+    return get_projections_index()['provinces'].get(country, [])
 
 def get_df_us():
-    df_projections = get_df_projections()
-    return df_projections.loc[(df_projections.Country == "US") & (df_projections.Province != 'None')]
+    df, index, _ = load_projections()
+    return take_locations(df, index, [k for k in index['locations'] if k[1] == 'US' and k[2] != 'None'])
+
+def get_map_locations():
+    return ['US', "Europe", "Asia", "North America", "South America", "Africa", 'World']
+
+def get_countries_with_provinces():
+    return ["US","Canada","Australia"]
 
 def get_cols():
     return {
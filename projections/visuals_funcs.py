@@ -1,6 +1,4 @@
 import datetime
-import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
 from textwrap import wrap
 
@@ -9,98 +7,31 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 
 from assets.mappings import get_states, get_colors
-from projections.utils import get_cols, get_df_us, add_cases, get_df_projections
+from projections.utils import get_cols, add_cases
+from projections.utils import get_location_projections, get_location_row, get_projection_cross_section
+from projections.figure_cache import cached_figure
+from projections.bundle import get_bundle_figure
+
+def build_hover_text(df_map, name_col, pop = 1):
+    suffix = '' if pop == 1 else ' Per Million'
+    text = df_map[name_col].astype(str)
+    for c in get_cols():
+        text = text + '<br>' + c + suffix + ' ' + df_map[c + suffix].astype(str)
+    return text
 
 def build_continent_map(map_date,val='Active', continent = 'World', pop = 1):
-    df_continent = get_df_projections()
-    if continent !='World':
-        df_continent = df_continent.loc[df_continent.Continent == continent] #Filter by continent
-
     if map_date is None:
         return None
 
     if isinstance(map_date, str):
         map_date = datetime.datetime.strptime(map_date, '%Y-%m-%d').date()
 
-    df_map = df_continent.loc[df_continent['Day'] == map_date]
-    df_map = df_map.loc[df_map['Province'] == 'None'] #exclude province data
-    df_map = df_map.loc[df_map['Country'] != 'None'] #exclude global world data
-
-    population = np.array([])
-    PopInfo = pd.read_csv('data/predicted/WorldPopulationInformation.csv', sep=",")
-
-    for i in df_map['Country']:
-        ind1 = np.logical_and(PopInfo['Country']==i, PopInfo['Province']=='None')
-        pop_val = PopInfo.loc[ind1,'pop'].values
-        population = np.concatenate((population, pop_val),0)
-
-    df_map['Population'] =population
-
-    df_map['Active Per Million'] = (np.round(1000000*df_map['Active']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Per Million'] = (np.round(1000000*df_map['Total Detected']/df_map['Population'], decimals = 2))
-    df_map['Active Hospitalized Per Million'] = (np.round(1000000*df_map['Active Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Cumulative Hospitalized Per Million'] = (np.round(1000000*df_map['Cumulative Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Deaths Per Million'] = (np.round(1000000*df_map['Total Detected Deaths']/df_map['Population'], decimals = 2))
-    df_map = df_map.applymap(str)
-
     cols = get_cols()
-    if (val is not None) and (val in cols) and  pop == 1:
-
-        df_map.loc[:,'text'] = df_map['Country'] + '<br>' + \
-                    'Total Detected ' + df_map['Total Detected'] + '<br>' + \
-                    'Active ' + df_map['Active'] + '<br>' + \
-                    'Active Hospitalized ' + df_map['Active Hospitalized'] + '<br>' + \
-                    'Cumulative Hospitalized ' + df_map['Cumulative Hospitalized'] + '<br>' + \
-                    'Total Detected Deaths ' + df_map['Total Detected Deaths']
-        zval = df_map[val].astype(float)
-
-    if (val is not None) and (val in cols) and  pop != 1:
-
-        df_map.loc[:,'text'] = df_map['Country'] + '<br>' + \
-                    'Total Detected Per Million ' + df_map['Total Detected Per Million'] + '<br>' + \
-                    'Active Per Million ' + df_map['Active Per Million'] + '<br>' + \
-                    'Active Hospitalized Per Million ' + df_map['Active Hospitalized Per Million'] + '<br>' + \
-                    'Cumulative Hospitalized Per Million ' + df_map['Cumulative Hospitalized Per Million'] + '<br>' + \
-                    'Total Detected Deaths Per Million ' + df_map['Total Detected Deaths Per Million']
-
-
-        zval = df_map[val+ " Per Million"].astype(float)
-
     if (val is not None) and (val in cols):
-        fig = go.Figure(data=go.Choropleth(
-            locations=df_map['Country'],
-            z= zval,
-            locationmode="country names",
-            autocolorscale=False,
-            colorscale='inferno_r',
-            text=df_map['text'], # hover text
-            marker_line_color='black', # line markers between states
-            colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
-        ))
-
-        fig.update_layout(
-                margin=dict(l=10, r=10, t=50, b=50),
-                title_text=add_cases('{} Predicted {} {}'.format(map_date.strftime('%b %d,%Y'), continent, val)),
-                geo = dict(
-                    scope= continent.lower() if continent is not None else None,
-                    projection=go.layout.geo.Projection(type = 'natural earth'),
-                    showlakes=True, # lakes
-                    lakecolor='rgb(255, 255, 255)',
-                    countrycolor='lightgray',
-                    landcolor='whitesmoke',
-                    showland=True,
-                    showframe = False,
-                    showcoastlines = True,
-                    showcountries=True,
-                    visible = False,
-                ),
-                modebar={
-                    'orientation': 'v',
-                    'bgcolor': 'rgba(0,0,0,0)',
-                    'color': 'lightgray',
-                    'activecolor': 'gray'
-                }
-            )
+        fig = cached_figure(
+            ('continent', map_date, val, continent, pop),
+            lambda: build_continent_map_figure(map_date, val, continent, pop)
+        )
 
         graph = dcc.Graph(
             id='continent-projection-map',
@@ -110,6 +41,46 @@ def build_continent_map(map_date,val='Active', continent = 'World', pop = 1):
         return graph
     return
 
+def build_continent_map_figure(map_date, val, continent, pop):
+    #country level rows only: no province data and no continent/world totals
+    df_map = get_projection_cross_section(map_date, continent)
+    text = build_hover_text(df_map, 'Country', pop)
+    zval = (df_map[val] if pop == 1 else df_map[val + " Per Million"]).astype(float)
+    fig = go.Figure(data=go.Choropleth(
+        locations=df_map['Country'],
+        z= zval,
+        locationmode="country names",
+        autocolorscale=False,
+        colorscale='inferno_r',
+        text=text, # hover text
+        marker_line_color='black', # line markers between states
+        colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
+    ))
+
+    fig.update_layout(
+            margin=dict(l=10, r=10, t=50, b=50),
+            title_text=add_cases('{} Predicted {} {}'.format(map_date.strftime('%b %d,%Y'), continent, val)),
+            geo = dict(
+                scope= continent.lower() if continent is not None else None,
+                projection=go.layout.geo.Projection(type = 'natural earth'),
+                showlakes=True, # lakes
+                lakecolor='rgb(255, 255, 255)',
+                countrycolor='lightgray',
+                landcolor='whitesmoke',
+                showland=True,
+                showframe = False,
+                showcoastlines = True,
+                showcountries=True,
+                visible = False,
+            ),
+            modebar={
+                'orientation': 'v',
+                'bgcolor': 'rgba(0,0,0,0)',
+                'color': 'lightgray',
+                'activecolor': 'gray'
+            }
+        )
+    return fig
 
 def build_us_map(map_date,val='Active', pop = 1):
     if map_date is None:
@@ -118,79 +89,12 @@ def build_us_map(map_date,val='Active', pop = 1):
     if isinstance(map_date, str):
         map_date = datetime.datetime.strptime(map_date, '%Y-%m-%d').date()
 
-    df_us = get_df_us()
-    df_map = df_us.loc[df_us['Day']==map_date]
-    df_map = df_map.loc[df_us['Province']!='US']
-
-    states = get_states()
-    df_map.loc[:,'code'] = df_map.Province.apply(lambda x: states[x])
-    population = np.array([])
-    PopInfo = pd.read_csv('data/predicted/WorldPopulationInformation.csv', sep=",")
-
-    for i in df_map['Province']:
-        pop_val = PopInfo.loc[PopInfo['Province']==i,'pop'].values
-        population = np.concatenate((population, pop_val),0)
-
-    df_map['Population'] =population
-    df_map['Active Per Million'] = (np.round(1000000*df_map['Active']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Per Million'] = (np.round(1000000*df_map['Total Detected']/df_map['Population'], decimals = 2))
-    df_map['Active Hospitalized Per Million'] = (np.round(1000000*df_map['Active Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Cumulative Hospitalized Per Million'] = (np.round(1000000*df_map['Cumulative Hospitalized']/df_map['Population'], decimals = 2))
-    df_map['Total Detected Deaths Per Million'] = (np.round(1000000*df_map['Total Detected Deaths']/df_map['Population'], decimals = 2))
-    df_map = df_map.applymap(str)
-
     cols = get_cols()
-    if (val is not None) and (val in cols) and pop == 1:
-
-        df_map.loc[:,'text'] = df_map['Province'] + '<br>' + \
-                    'Total Detected ' + df_map['Total Detected'] + '<br>' + \
-                    'Active ' + df_map['Active'] + '<br>' + \
-                    'Active Hospitalized ' + df_map['Active Hospitalized'] + '<br>' + \
-                    'Cumulative Hospitalized ' + df_map['Cumulative Hospitalized'] + '<br>' + \
-                    'Total Detected Deaths ' + df_map['Total Detected Deaths']
-
-        z_val = df_map[val].astype(float)
-
-
-    if (val is not None) and (val in cols) and pop != 1:
-
-        df_map.loc[:,'text'] = df_map['Province'] + '<br>' + \
-            'Total Detected Per Million ' + df_map['Total Detected Per Million'] + '<br>' + \
-            'Active Per Million ' + df_map['Active Per Million'] + '<br>' + \
-            'Active Hospitalized Per Million ' + df_map['Active Hospitalized Per Million'] + '<br>' + \
-            'Cumulative Hospitalized Per Million ' + df_map['Cumulative Hospitalized Per Million'] + '<br>' + \
-            'Total Detected Deaths Per Million ' + df_map['Total Detected Deaths Per Million']
-        z_val =df_map[val+ " Per Million"].astype(float)
-
     if (val is not None) and (val in cols):
-        fig = go.Figure(data=go.Choropleth(
-            locations=df_map['code'],
-            z=z_val,
-            locationmode='USA-states',
-            colorscale='inferno_r',
-            autocolorscale=False,
-            text=df_map['text'], # hover text
-            marker_line_color='white' , # line markers between states
-            colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
-        ))
-
-
-        fig.update_layout(
-                margin=dict(l=10, r=10, t=50, b=50),
-                title_text=add_cases('{} Predicted US {}'.format(map_date.strftime('%b %d,%Y'), val)),
-                geo = dict(
-                    scope='usa',
-                    projection=go.layout.geo.Projection(type = 'albers usa'),
-                    showlakes=True, # lakes
-                    lakecolor='rgb(255, 255, 255)'
-                ),
-                modebar={
-                    'orientation': 'v',
-                    'bgcolor': 'rgba(0,0,0,0)',
-                    'color': 'lightgray',
-                    'activecolor': 'gray'
-                }
-            )
+        fig = cached_figure(
+            ('us', map_date, val, pop),
+            lambda: build_us_map_figure(map_date, val, pop)
+        )
 
         graph = dcc.Graph(
             id='us-projection-map',
@@ -199,26 +103,79 @@ def build_us_map(map_date,val='Active', pop = 1):
         return graph
     return
 
+def build_us_map_figure(map_date, val, pop):
+    df_map = get_projection_cross_section(map_date, 'US')
+    codes = df_map.Province.map(get_states())
+    text = build_hover_text(df_map, 'Province', pop)
+    z_val = (df_map[val] if pop == 1 else df_map[val + " Per Million"]).astype(float)
+    fig = go.Figure(data=go.Choropleth(
+        locations=codes,
+        z=z_val,
+        locationmode='USA-states',
+        colorscale='inferno_r',
+        autocolorscale=False,
+        text=text, # hover text
+        marker_line_color='white' , # line markers between states
+        colorbar_title='<br>'.join(wrap(''.join(['{}'.format(add_cases(val))]), width=10))
+    ))
+
+    fig.update_layout(
+            margin=dict(l=10, r=10, t=50, b=50),
+            title_text=add_cases('{} Predicted US {}'.format(map_date.strftime('%b %d,%Y'), val)),
+            geo = dict(
+                scope='usa',
+                projection=go.layout.geo.Projection(type = 'albers usa'),
+                showlakes=True, # lakes
+                lakecolor='rgb(255, 255, 255)'
+            ),
+            modebar={
+                'orientation': 'v',
+                'bgcolor': 'rgba(0,0,0,0)',
+                'color': 'lightgray',
+                'activecolor': 'gray'
+            }
+        )
+    return fig
+
 def find_smallest_scope(state, country, continent):
     location = state
     if state in 'None':
-        if country is 'None':
+        if country == 'None':
             location = continent
         else:
             location = country
     return location
 
 def build_state_projection(state, country, continent, vals):
+    fig = get_bundle_figure(('timeline', state, country, continent))
+    if fig is not None:
+        #bundled timelines carry every metric, keep the selected ones in the selected order
+        cols = get_cols()
+        traces = {trace['name']: trace for trace in fig['data']}
+        if (vals is not None) and (set(vals).issubset(set(cols))):
+            fig['data'] = [traces[val] for val in vals]
+        else:
+            fig['data'] = []
+    else:
+        fig = build_state_projection_figure(state, country, continent, vals)
+
+    graph = dcc.Graph(
+        id='projection-graph',
+        figure=fig
+    )
+    return graph
+
+def build_state_projection_figure(state, country, continent, vals):
     location = find_smallest_scope(state, country, continent)
-    df_projections = get_df_projections()
-    df_projections_sub = df_projections.loc[ (df_projections.Province == state) & (df_projections.Country == country)]
-    if continent not in ['US', 'World']:
-        df_projections_sub = df_projections_sub.loc[(df_projections_sub.Continent == continent)]
     if continent == 'US':
-        df_projections_sub = df_projections.loc[(df_projections.Country == 'US') & (df_projections.Province == state)]
-    if continent == 'World':
-        if country =='None':
-            df_projections_sub = df_projections.loc[(df_projections.Continent == 'None')] #include only global world data
+        df_projections_sub = get_location_projections('US', state)
+    elif continent == 'World':
+        if country == 'None':
+            df_projections_sub = get_location_projections('None', 'None', 'None') #include only global world data
+        else:
+            df_projections_sub = get_location_projections(country, state)
+    else:
+        df_projections_sub = get_location_projections(country, state, continent)
     fig = go.Figure()
 
     cols = get_cols()
@@ -266,34 +223,26 @@ def build_state_projection(state, country, continent, vals):
                     'activecolor': 'gray'
                 }
             )
-
-    graph = dcc.Graph(
-        id='projection-graph',
-        figure=fig
-    )
-    return graph
+    return fig
 
 def get_stat(d, val, scope):
     if d is None:
         return None
     if isinstance(d, str):
         d = datetime.datetime.strptime(d, '%Y-%m-%d').date()
-    df_projections = get_df_projections()
     if scope == 'US':
-        df_projections_sub = df_projections.loc[(df_projections.Country == scope) & (df_projections.Province == 'None')]
+        row = get_location_row(scope, 'None', None, d)
     elif scope =='World':
-        df_projections_sub = df_projections.loc[df_projections.Continent == 'None']
+        row = get_location_row('None', 'None', 'None', d)
     else:
-        df_projections_sub = df_projections.loc[(df_projections.Continent == scope) & (df_projections.Country == 'None')]
-
-    df_projections_sub = df_projections_sub.loc[df_projections_sub['Day']==d].reset_index()
+        row = get_location_row('None', 'None', scope, d)
 
-    if df_projections_sub.empty:
+    if row is None:
         return None
 
     card_content = [
         dbc.CardHeader(
-            f'{df_projections_sub.iloc[0][val]:,}',
+            f'{row[val]:,}',
             style={"textAlign":"center","fontSize":30,"fontWeight": "bold","color":'#1E74F0'}
         ),
         dbc.CardBody(
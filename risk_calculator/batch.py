@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+
+import numpy as np
+
+from risk_calculator.models import get_model_bundle, predict_scores, explain_rows
+from risk_calculator.imputation import impute
+from risk_calculator.utils import valid_input, build_feature_vector, get_title_mapping
+
+#rows are validated, imputed and scored this many at a time, so results start streaming
+#before the whole upload has been scored
+batch_chunk_size = 500
+max_batch_rows = 50000
+
+def parse_value(val):
+    if val is None or (isinstance(val, str) and val.strip() == ''):
+        return None
+    return float(val)
+
+def parse_comorbidities(val):
+    if val is None:
+        return []
+    if isinstance(val, str):
+        return [c.strip() for c in val.split(';') if c.strip()]
+    return list(val)
+
+def read_patients(request):
+    #a json array of objects, or a csv with one patient per row. Comorbidities are a list in json
+    #and separated by ';' in csv
+    if request.is_json:
+        patients = request.get_json()
+        if not isinstance(patients, list) or not all(isinstance(p, dict) for p in patients):
+            raise ValueError("Expected a JSON array of patient objects.")
+        return patients
+    text = request.get_data(as_text=True)
+    return list(csv.DictReader(io.StringIO(text)))
+
+def get_value(patient, name):
+    #columns can be named after the model feature or its English title
+    if name in patient:
+        return patient[name]
+    return patient.get(get_title_mapping()[0].get(name))
+
+def patient_to_feature_vals(m, features, patient):
+    #same layout as the calculator form: categorical, numerics, then the comorbidities list
+    vals = []
+    for feat in features["categorical"]:
+        val = parse_value(get_value(patient, feat["name"]))
+        if val not in feat["vals"]:
+            raise ValueError("{} must be one of {}.".format(feat["name"], feat["vals"]))
+        vals.append(val)
+    for feat in features["numeric"]:
+        vals.append(parse_value(get_value(patient, feat["name"])))
+    if m:
+        multidrop = features["multidrop"][0]
+        comorbidities = parse_comorbidities(get_value(patient, multidrop["name"]))
+        unknown = [c for c in comorbidities if c not in multidrop["vals"]]
+        if unknown:
+            raise ValueError("Unknown {}: {}.".format(multidrop["name"], ', '.join(unknown)))
+        vals.append(comorbidities)
+    return vals
+
+def score_chunk(m, bundle, patients, start, temp_unit, language, with_shap):
+    features = bundle["features"]
+    columns = bundle["columns"]
+    length = len(features["numeric"])
+    results = [None]*len(patients)
+    x = np.zeros((len(patients), len(columns)))
+    positions = []
+    for i, patient in enumerate(patients):
+        results[i] = {"row": start+i}
+        try:
+            vals = patient_to_feature_vals(m, features, patient)
+        except (ValueError, TypeError) as e:
+            results[i]["error"] = str(e)
+            continue
+        valid, err, vals = valid_input(features["numeric"], vals, length, language)
+        if not valid:
+            results[i]["error"] = err
+            continue
+        build_feature_vector(bundle["layout"], vals, temp_unit, x[len(positions)])
+        positions.append(i)
+    if not positions:
+        return results
+    x = x[:len(positions)]
+    x_full = impute(bundle["imputer_index"], x)
+    scores = predict_scores(bundle, x_full)
+    if with_shap:
+        shap_values = explain_rows(bundle, x_full)
+        expected_value = float(np.ravel(bundle["explainer"].expected_value)[0])
+    missing = np.isnan(x)
+    for j, i in enumerate(positions):
+        results[i]["risk"] = round(float(scores[j]), 4)
+        results[i]["imputed"] = {columns[c]: round(float(x_full[j, c]), 2) for c in np.flatnonzero(missing[j])}
+        if with_shap:
+            results[i]["expected_value"] = expected_value
+            results[i]["shap"] = dict(zip(columns, np.round(shap_values[j], 4).tolist()))
+    return results
+
+def score_patients(m, labs, patients, temp_unit=("°F",), language=0, with_shap=False):
+    #returns a generator of one result dict per patient, in input order. The model is loaded
+    #here rather than in the generator so that a failure surfaces before the response starts
+    bundle = get_model_bundle(m, labs)
+    return (
+        result
+        for start in range(0, len(patients), batch_chunk_size)
+        for result in score_chunk(m, bundle, patients[start:start+batch_chunk_size], start, temp_unit, language, with_shap)
+    )
+
+def stream_json(results):
+    yield '['
+    for i, result in enumerate(results):
+        yield (',\n' if i else '\n') + json.dumps(result, ensure_ascii=False)
+    yield '\n]\n'
+
+def stream_csv(results, columns, with_shap):
+    fields = ["row", "risk", "error", "imputed"]
+    if with_shap:
+        fields += ["expected_value"] + ["shap: " + c for c in columns]
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    for result in results:
+        row = {k: result.get(k, '') for k in ["row", "risk", "error", "expected_value"] if k in fields}
+        row["imputed"] = '; '.join('{}={}'.format(k, v) for k, v in result.get("imputed", {}).items())
+        for c, v in result.get("shap", {}).items():
+            row["shap: " + c] = v
+        writer.writerow(row)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
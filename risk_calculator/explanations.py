@@ -0,0 +1,141 @@
+import os
+import base64
+import math
+from io import BytesIO
+from textwrap import wrap
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from risk_calculator.render_pool import render_in_pool, render_workers
+
+#"matplotlib" keeps shap.force_plot rasterized to PNG, "svg" draws the force chart directly from the shap values
+explanation_renderer = os.environ.get('EXPLANATION_RENDERER', 'matplotlib')
+
+positive_color = '#ff0d57'
+negative_color = '#1e88e5'
+svg_width = 1000
+svg_height = 200
+axis_y = 70
+bar_height = 26
+label_min_width = 60
+
+def sigmoid(x):
+    return 1/(1+math.exp(-x))
+
+def format_value(x):
+    return '{:g}'.format(round(float(x), 2))
+
+def render_matplotlib(expected_value, shap_values, x, names):
+    #shap and matplotlib take most of a second to import, only pay for them where plots are drawn
+    import shap
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    names = ['\n'.join(wrap(name, width=12)) for name in names]
+    fig = shap.force_plot(
+        np.around(expected_value, decimals=2),
+        np.around(shap_values, decimals=2),
+        np.around(x, decimals=2),
+        link = "logit",
+        matplotlib = True,
+        show = False,
+        feature_names=names
+    )
+    plt.axis('off') # this rows the rectangular frame
+    imgByteArr = BytesIO()
+    fig.savefig(imgByteArr, format='PNG')
+    #force_plot leaves the figure registered with pyplot, drop it so workers do not accumulate them
+    plt.close(fig)
+    encoded = base64.b64encode(imgByteArr.getvalue())
+    return 'data:image/png;base64,{}'.format(encoded.decode())
+
+def svg_text(x, y, lines, size=12, anchor='middle', color='#333', weight='normal'):
+    spans = ''.join(
+        "<tspan x='{:.1f}' dy='{}'>{}</tspan>".format(x, 0 if i == 0 else size+1, escape(line))
+        for i, line in enumerate(lines)
+    )
+    return "<text x='{:.1f}' y='{:.1f}' font-size='{}' text-anchor='{}' fill='{}' font-weight='{}'>{}</text>".format(
+        x, y, size, anchor, color, weight, spans)
+
+def svg_segment(x0, x1, color, positive):
+    #chevron pointing towards the prediction, like the shap force plot
+    tip = min(6, abs(x1-x0)/2)
+    top = axis_y+8
+    bottom = top+bar_height
+    middle = top+bar_height/2
+    if positive:
+        points = [(x0, top), (x1-tip, top), (x1, middle), (x1-tip, bottom), (x0, bottom), (x0+tip, middle)]
+    else:
+        points = [(x0+tip, top), (x1, top), (x1-tip, middle), (x1, bottom), (x0+tip, bottom), (x0, middle)]
+    return "<polygon points='{}' fill='{}' stroke='white' stroke-width='1'/>".format(
+        ' '.join('{:.1f},{:.1f}'.format(px, py) for px, py in points), color)
+
+def render_svg(expected_value, shap_values, x, names):
+    base = float(np.ravel(expected_value)[0])
+    values = np.ravel(shap_values).astype(float)
+    inputs = np.ravel(x).astype(float)
+    fx = base + values.sum()
+    positive = [i for i in np.argsort(-values) if values[i] > 0]
+    negative = [i for i in np.argsort(values) if values[i] < 0]
+    low = min(base, fx - values[positive].sum())
+    high = max(base, fx - values[negative].sum())
+    pad = max((high-low)*0.1, 0.5)
+    low, high = low-pad, high+pad
+    scale = (svg_width-40)/(high-low)
+
+    def pos(v):
+        return 20+(v-low)*scale
+
+    parts = [
+        "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {} {}' font-family='Arial, sans-serif'>".format(svg_width, svg_height),
+        "<line x1='20' y1='{0}' x2='{1}' y2='{0}' stroke='#999'/>".format(axis_y, svg_width-20)
+    ]
+    #ticks are spaced evenly in log odds but labelled as probabilities
+    for t in np.linspace(low, high, 7)[1:-1]:
+        parts.append("<line x1='{0:.1f}' y1='{1}' x2='{0:.1f}' y2='{2}' stroke='#999'/>".format(pos(t), axis_y-4, axis_y))
+        parts.append(svg_text(pos(t), axis_y-8, [format_value(sigmoid(t))], size=11, color='#777'))
+    parts.append(svg_text(pos(base), axis_y-24, ['base value'], size=11, color='#777'))
+    parts.append(svg_text(pos(fx), 22, ['f(x) = '+format_value(sigmoid(fx))], size=15, weight='bold'))
+    #positive contributions push up to f(x) from the left, negative ones push down from the right
+    end = fx
+    for i in positive:
+        start = end-values[i]
+        parts.append(svg_segment(pos(start), pos(end), positive_color, True))
+        if (end-start)*scale >= label_min_width:
+            label = wrap(names[i], width=14)+['= '+format_value(inputs[i])]
+            parts.append(svg_text((pos(start)+pos(end))/2, axis_y+bar_height+24, label, size=11, color=positive_color))
+        end = start
+    start = fx
+    for i in negative:
+        end = start-values[i]
+        parts.append(svg_segment(pos(start), pos(end), negative_color, False))
+        if (end-start)*scale >= label_min_width:
+            label = wrap(names[i], width=14)+['= '+format_value(inputs[i])]
+            parts.append(svg_text((pos(start)+pos(end))/2, axis_y+bar_height+24, label, size=11, color=negative_color))
+        start = end
+    parts.append("<line x1='{0:.1f}' y1='30' x2='{0:.1f}' y2='{1}' stroke='#333' stroke-width='2'/>".format(pos(fx), axis_y+8+bar_height))
+    parts.append('</svg>')
+    return 'data:image/svg+xml;charset=utf-8,'+quote(''.join(parts), safe=" =:/,.'()-")
+
+renderers = {
+    'svg': render_svg,
+    'matplotlib': render_matplotlib
+}
+
+#renderers that run in the render pool rather than in the web worker, the svg one keeps no state
+#and takes about a millisecond, less than the round trip would
+pooled_renderers = ['matplotlib']
+
+def render_explanation(expected_value, shap_values, x, names, renderer=None):
+    #returns a data uri for the html.Img showing the shap explanation of one prediction, and
+    #whether it is a stand-in for a plot the renderer failed to draw
+    renderer = renderer or explanation_renderer
+    if renderer in pooled_renderers and render_workers > 0:
+        try:
+            return render_in_pool(renderer, (expected_value, shap_values, x, names)), False
+        except RuntimeError:
+            #a stuck or crashed renderer should not cost the user the score
+            return render_svg(expected_value, shap_values, x, names), True
+    return renderers[renderer](expected_value, shap_values, x, names), False
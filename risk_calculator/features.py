@@ -1,9 +1,9 @@
-import pickle
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 
 from risk_calculator.utils import get_title_mapping,labs_ques, oxygen, oxygen_vals
+from risk_calculator.models import get_features
 
 def build_feature_importance_graph(m=True,labs=False):
     image = 'assets/risk_calculators/'
@@ -232,21 +232,7 @@ def build_multidrop_card(id, m, content_dict,language):
 
 
 def build_feature_cards(m=True,labs=False,language=0):
-    if m:
-        if labs:
-            with open('assets/risk_calculators/mortality/labs_json.pkl', 'rb') as file:
-                features_pickle = pickle.load(file)
-        else:
-            with open('assets/risk_calculators/mortality/without_labs_json.pkl', 'rb') as file:
-                features_pickle = pickle.load(file)
-    else:
-        if labs:
-            with open('assets/risk_calculators/infection/labs_json.pkl', 'rb') as file:
-                features_pickle = pickle.load(file)
-        else:
-            with open('assets/risk_calculators/infection/without_labs_json.pkl', 'rb') as file:
-                features_pickle = pickle.load(file)
-    features = features_pickle["json"]
+    features = get_features(m, labs)
     card_content = []
     cards = []
     inputs = features["numeric"]
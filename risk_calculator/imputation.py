@@ -0,0 +1,183 @@
+import threading
+import itertools
+
+import numpy as np
+
+#Nearest neighbour imputation on the data a KNNImputer was fitted on, without its brute force
+#distance pass over every training row. The risk imputers are fitted on complete rows, so every
+#training row is a donor for every column and all donors share the same observed columns. The
+#nan_euclidean ranking is then the plain euclidean ranking over the row's observed columns, which
+#a KD-tree per missingness pattern answers exactly. Anything else is left to the imputer itself.
+#transform sums the donors' float32 values in the order np.argpartition leaves them, which
+#depends on every distance as sklearn rounds them and which the tree does not give. A row is only
+#imputed from the tree when its sums come out the same in every order; rows with a tie at the
+#k-th donor or with sums that depend on the order go through transform's own distance pass.
+#scipy and sklearn are imported where they are used: unpickling the imputer brings them in anyway,
+#and importing this module should not.
+max_pattern_trees = 512
+#a pattern gets its own tree once it has been seen this often or comes with this many rows,
+#before that a numpy pass over the observed columns is cheaper than building the tree
+tree_min_hits = 2
+tree_min_rows = 32
+#training rows whose squared distance is within this relative gap of the k-th are tied with it.
+#When tied rows straddle the k-th place and disagree on the missing values, the row is imputed
+#the way KNNImputer.transform does it, to get the donors sklearn picks
+tie_tolerance = 1e-9
+#neighbours fetched beyond the k-th to see the whole tie
+tie_candidates = 16
+#the sums are tried in all k! orders up to this k, past it every row takes the distance pass
+max_ordered_neighbors = 6
+#rows whose sums are tried at a time, each takes k! * k values per missing column
+order_chunk_rows = 64
+
+def build_imputer_index(imputer):
+    fit_X = np.asarray(imputer._fit_X)
+    k = imputer.n_neighbors
+    exact = (
+        imputer.metric == 'nan_euclidean'
+        and imputer.weights == 'uniform'
+        and not imputer.add_indicator
+        and np.isnan(imputer.missing_values)
+        and not np.isnan(fit_X).any()
+        and len(fit_X) > k
+    )
+    return {
+        "imputer": imputer,
+        "exact": exact,
+        "fit_X": fit_X,
+        "fit_X64": fit_X.astype(float),
+        "norms": np.nanmax(fit_X.astype(float)**2, axis=0),
+        "k": k,
+        "orders": np.array(list(itertools.permutations(range(k)))) if k <= max_ordered_neighbors else None,
+        #column by column, as KNNImputer takes them for rows with nothing to measure a distance on
+        "means": np.array([np.ma.array(column, mask=np.isnan(column)).mean() for column in fit_X.T]),
+        "trees": {},
+        "hits": {},
+        "lock": threading.Lock()
+    }
+
+def get_pattern_tree(index, observed, n_rows):
+    key = observed.tobytes()
+    tree = index["trees"].get(key)
+    if tree is None:
+        hits = index["hits"].get(key, 0) + 1
+        if len(index["hits"]) < 8*max_pattern_trees:
+            index["hits"][key] = hits
+        if (hits < tree_min_hits and n_rows < tree_min_rows) or len(index["trees"]) >= max_pattern_trees:
+            return None
+        from scipy.spatial import cKDTree
+        tree = cKDTree(index["fit_X64"][:, observed])
+        with index["lock"]:
+            index["trees"][key] = tree
+    return tree
+
+def nearest(index, observed, x_observed):
+    #squared euclidean distances over the observed columns to the nearest training rows, nearest first
+    n = min(index["k"]+tie_candidates, len(index["fit_X"]))
+    tree = get_pattern_tree(index, observed, len(x_observed))
+    if tree is not None:
+        dist, donors = tree.query(x_observed, k=n)
+        return dist**2, donors
+    dist = ((index["fit_X64"][np.newaxis, :, observed] - x_observed[:, np.newaxis, :])**2).sum(axis=2)
+    donors = np.argpartition(dist, n-1, axis=1)[:, :n]
+    dist = np.take_along_axis(dist, donors, axis=1)
+    order = np.argsort(dist, axis=1)
+    return np.take_along_axis(dist, order, axis=1), np.take_along_axis(donors, order, axis=1)
+
+def same_values(fit_X, donors, tied, missing):
+    #whether all tied candidates of each row agree on the missing columns
+    values = fit_X[donors][:, :, missing]
+    first = values[np.arange(len(donors)), tied.argmax(axis=1)]
+    return ((values == first[:, np.newaxis, :]).all(axis=2) | ~tied).all(axis=1)
+
+def average_donors(index, donors, missing):
+    #KNNImputer's unweighted masked average: each column's donor values summed in the training
+    #dtype, in the order np.argpartition left them, then divided by the donor count in float64.
+    #The values are laid out one column per row, as sklearn has them, for numpy to reduce them the
+    #same way
+    values = np.ascontiguousarray(index["fit_X"][donors][:, missing].T)
+    return values.sum(axis=1)*1./np.full(missing.sum(), len(donors))
+
+def average_unordered(index, donors, missing):
+    #average_donors for rows of donors in no particular order: the sums in every order, laid out
+    #the same way, and whether they all agree, which is when the order does not matter
+    k = donors.shape[1]
+    if index["orders"] is None:
+        return None, np.zeros(len(donors), dtype=bool)
+    sums = np.empty((len(donors), missing.sum()), dtype=index["fit_X"].dtype)
+    settled = np.empty(len(donors), dtype=bool)
+    for start in range(0, len(donors), order_chunk_rows):
+        values = index["fit_X"][donors[start:start+order_chunk_rows]][:, :, missing]
+        #(rows, columns, orders, k)
+        ordered = np.ascontiguousarray(values[:, index["orders"]].transpose(0, 3, 1, 2)).sum(axis=3)
+        sums[start:start+order_chunk_rows] = ordered[:, :, 0]
+        settled[start:start+order_chunk_rows] = (ordered == ordered[:, :, :1]).all(axis=(1, 2))
+    return sums*1./np.full(sums.shape, k), settled
+
+def impute_exact(index, X):
+    fit_X = index["fit_X"]
+    k = index["k"]
+    mask = np.isnan(X)
+    rows = np.flatnonzero(mask.any(axis=1))
+    fallback = []
+    if len(rows) == 0:
+        return X, fallback
+    if len(rows) == 1:
+        patterns, inverse = mask[rows], np.zeros(1, dtype=int)
+    else:
+        patterns, inverse = np.unique(mask[rows], axis=0, return_inverse=True)
+    for p, missing in enumerate(patterns):
+        group = rows[np.ravel(inverse) == p]
+        observed = ~missing
+        if not observed.any():
+            #no distance can be computed, KNNImputer falls back to the column means
+            X[np.ix_(group, missing)] = index["means"][missing]
+            continue
+        x_observed = X[np.ix_(group, observed)]
+        dist, donors = nearest(index, observed, x_observed)
+        #sklearn works the distances out as |x|^2 - 2xy + |y|^2, so its rounding error grows with the norms
+        tol = tie_tolerance*((x_observed**2).sum(axis=1) + index["norms"][observed].sum())
+        tied = np.abs(dist - dist[:, k-1:k]) <= tol[:, np.newaxis]
+        ambiguous = tied[:, k] & (tied[:, -1] | ~same_values(fit_X, donors, tied, missing))
+        values, settled = average_unordered(index, donors[:, :k], missing)
+        clear = ~ambiguous & settled
+        X[np.ix_(group[clear], missing)] = values[clear]
+        fallback.extend(group[~clear])
+    return X, fallback
+
+def impute_brute(index, X, out, targets):
+    #KNNImputer.transform's own pass for the rows in targets: the distances of all of X's rows
+    #with a missing value, computed together and chunk by chunk as transform does it, since their
+    #rounding depends on the rows computed with them, and argpartition over each target's
+    from sklearn.metrics import pairwise_distances_chunked
+    k = index["k"]
+    mask = np.isnan(X)
+    rows = np.flatnonzero(mask.any(axis=1))
+    targets = set(targets)
+
+    def impute_chunk(dist, start):
+        for i, row_dist in zip(rows[start:start+len(dist)], dist):
+            if i in targets:
+                out[i, mask[i]] = average_donors(index, np.argpartition(row_dist, k-1)[:k], mask[i])
+
+    for _ in pairwise_distances_chunked(X[rows], index["fit_X"], metric='nan_euclidean',
+                                        missing_values=np.nan, reduce_func=impute_chunk):
+        pass
+
+def impute(index, X):
+    #drop in for imputer.transform(X) on the index's imputer
+    X = np.array(X, dtype=float)
+    if not index["exact"]:
+        return index["imputer"].transform(X)
+    original = X.copy()
+    X, fallback = impute_exact(index, X)
+    if fallback:
+        impute_brute(index, original, X, fallback)
+    return X
+
+def verify_imputer_index(index, X):
+    #whether the index imputes X, and each of its rows on its own as the calculator does, exactly
+    #as imputer.transform does
+    X = np.array(X, dtype=float)
+    batches = [X] + [X[i:i+1] for i in range(len(X))]
+    return all(np.array_equal(impute(index, batch), index["imputer"].transform(batch)) for batch in batches)
@@ -1,4 +1,3 @@
-import pickle
 import math
 
 import dash_html_components as html
@@ -8,18 +7,13 @@ from navbar import Navbar
 from footer import Footer
 
 from risk_calculator.utils import predict_risk, valid_input, get_oxygen_ind
+from risk_calculator.models import get_model_bundle, get_features, get_columns
 from risk_calculator.visuals import get_labs_indicator,get_model_desc,get_feature_importance, get_inputed_vals
 from risk_calculator.visuals import get_feature_cards, get_submit_button, get_results_card
 from risk_calculator.visuals import get_lang,get_page_desc, get_personal_visual
 
 def get_cols(labs):
-    if labs:
-        with open('assets/risk_calculators/infection/labs_data.pkl', 'rb') as file:
-            data = pickle.load(file)
-    else:
-        with open('assets/risk_calculators/infection/without_labs_data.pkl', 'rb') as file:
-            data = pickle.load(file)
-    return data["columns"]
+    return get_columns(False, labs)
 
 def get_infec_oxygen_cols():
     cols = get_cols(False)
@@ -49,44 +43,13 @@ def InfectionRiskCalc():
     return layout
 
 def valid_input_infec(labs,feature_vals,language):
-    if labs:
-        with open('assets/risk_calculators/infection/labs_imputer.pkl', 'rb') as file:
-            imputer_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-    else:
-        with open('assets/risk_calculators/infection/without_labs_imputer.pkl', 'rb') as file:
-            imputer_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/without_labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-    features = features_pickle["json"]
-    imputer = imputer_pickle["imputer"]
+    features = get_features(False, labs)
     length = len(features["numeric"])
     return valid_input(features["numeric"],feature_vals[0],length,language)
 
 def predict_risk_infec(labs,feature_vals,temp_unit,card_text,language):
-    if labs:
-        with open('assets/risk_calculators/infection/labs_imputer.pkl', 'rb') as file:
-            imputer_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/labs_model_explainer.pkl', 'rb') as file:
-            model_pickle = pickle.load(file)
-        cols = get_cols(True)
-    else:
-        with open('assets/risk_calculators/infection/without_labs_imputer.pkl', 'rb') as file:
-            imputer_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/without_labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-        with open('assets/risk_calculators/infection/without_labs_model_explainer.pkl', 'rb') as file:
-            model_pickle = pickle.load(file)
-        cols = get_cols(False)
-    model = model_pickle["model"]
-    features = features_pickle["json"]
-    imputer = imputer_pickle["imputer"]
-    explainer = model_pickle["explainer"]
-
-    score,impute_text,plot = predict_risk(False,model,features,imputer,explainer,feature_vals,cols,temp_unit,labs,language)
+    bundle = get_model_bundle(False, labs)
+    score,impute_text,plot = predict_risk(False,bundle,feature_vals,temp_unit,labs,language)
     card_content = [
         html.H4(card_text[0],className="score-calculator-card-content-infection"),
         html.H4(str(int(math.floor(score/10.0)))+card_text[1],className="score-calculator-card-content-infection"),
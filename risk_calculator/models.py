@@ -0,0 +1,151 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from risk_calculator.imputation import build_imputer_index
+from risk_calculator.trees import export_trees, verify_trees, predict_proba
+from risk_calculator.treeshap import get_shap_tables_size, build_shap_tables, shap_values, verify_shap_tables
+
+#Each (task, labs) pair has up to four pickles: the feature json, the training metadata,
+#the imputer and the model/explainer pair. They are unpickled once per worker and shared,
+#so callers must not modify what they get back.
+_assets = {}
+_bundles = {}
+#the exported trees score up to this many rows at a time, xgboost's own threaded predict is
+#faster on bigger batches
+compiled_max_rows = 64
+#rows of the imputer's training data the exported trees are checked on before they are used
+verify_rows = 512
+#the SHAP tables are checked against the explainer on this many of those rows, and are used if
+#no value (nor the expected value) is further off than shap_tolerance
+shap_verify_rows = 64
+shap_tolerance = 1e-4
+#the tables hold 2**depth rows per path and take 2**depth passes to build: models deeper than
+#this, or whose tables would hold more float64 values than this (64 MB), are left to the explainer.
+#The shipped models are 1 (mortality with labs, 4,248 values), 2 (mortality without labs, 18,672)
+#and 4 levels deep (infection without labs, 655,552 values or 5 MB)
+shap_max_depth = 8
+shap_max_entries = 8*1024*1024
+_models_lock = threading.Lock()
+
+def get_task(m):
+    return 'mortality' if m else 'infection'
+
+def get_asset_path(m, labs, name):
+    return 'assets/risk_calculators/{}/{}_{}.pkl'.format(get_task(m), 'labs' if labs else 'without_labs', name)
+
+def load_asset(m, labs, name):
+    path = get_asset_path(m, bool(labs), name)
+    asset = _assets.get(path)
+    if asset is None:
+        with _models_lock:
+            asset = _assets.get(path)
+            if asset is None:
+                with open(path, 'rb') as file:
+                    asset = pickle.load(file)
+                _assets[path] = asset
+    return asset
+
+def get_features(m, labs):
+    return load_asset(m, labs, 'json')["json"]
+
+def get_model_data(m, labs):
+    return load_asset(m, labs, 'data')
+
+def get_columns(m, labs):
+    return get_model_data(m, labs)["columns"]
+
+def build_feature_layout(m, features, n):
+    #where each calculator input lands in the model's column order, worked out once per model
+    #so a row can be written straight into a numpy buffer
+    numeric = features["numeric"]
+    layout = {
+        "n": n,
+        "categorical": np.array([f["index"] for f in features["categorical"]], dtype=int),
+        "numeric": np.array([f["index"] for f in numeric], dtype=int),
+        "temperature": np.array([f["name"] == "Body Temperature" for f in numeric], dtype=bool),
+        "comorbidities": {}
+    }
+    if m:
+        multidrop = features["multidrop"][0]
+        layout["comorbidities"] = dict(zip(multidrop["vals"], multidrop["index"]))
+    return layout
+
+def validate_model_bundle(bundle):
+    columns = bundle["columns"]
+    features = bundle["features"]
+    n = len(bundle["model"].feature_importances_)
+    if len(columns) != n:
+        raise ValueError("{} columns for a model with {} features".format(len(columns), n))
+    indexes = [f["index"] for f in features["categorical"] + features["numeric"]]
+    for multidrop in features["multidrop"]:
+        indexes += multidrop["index"]
+    if sorted(indexes) != list(range(n)):
+        raise ValueError("Feature indexes do not cover the {} model columns".format(n))
+    names = bundle["model"].get_booster().feature_names
+    if names is not None and list(names) != list(columns):
+        raise ValueError("Model feature names do not match the stored column order")
+    fit_X = getattr(bundle["imputer"], "_fit_X", None)
+    if fit_X is not None and fit_X.shape[1] != n:
+        raise ValueError("Imputer was fitted on {} columns, model expects {}".format(fit_X.shape[1], n))
+
+def get_verified_trees(model, X):
+    #the exported trees are only used if they give the same bits as the model on X
+    try:
+        trees = export_trees(model)
+    except Exception as e:
+        #a model dump this xgboost writes differently, predictions go through predict_proba
+        print('Could not export the model trees, using predict_proba: {}'.format(e))
+        return None
+    return trees if verify_trees(trees, model, X) == 0 else None
+
+def get_verified_shap_tables(trees, explainer, X):
+    if trees is None or getattr(explainer, "feature_perturbation", "tree_path_dependent") != "tree_path_dependent":
+        return None
+    if trees["depth"] > shap_max_depth or get_shap_tables_size(trees) > shap_max_entries:
+        return None
+    tables = build_shap_tables(trees)
+    return tables if verify_shap_tables(trees, tables, explainer, X) <= shap_tolerance else None
+
+def predict_scores(bundle, X):
+    #probability of the positive class for each row of X, in model column order
+    if bundle["trees"] is not None and len(X) <= compiled_max_rows:
+        return predict_proba(bundle["trees"], X)[:,1]
+    return bundle["model"].predict_proba(X, validate_features=False)[:,1]
+
+def explain_rows(bundle, X):
+    #SHAP values of the model margin for each row of X, in model column order
+    if bundle["shap_tables"] is not None:
+        return shap_values(bundle["trees"], bundle["shap_tables"], X)
+    return np.asarray(bundle["explainer"].shap_values(X))
+
+def get_model_bundle(m, labs):
+    key = (bool(m), bool(labs))
+    bundle = _bundles.get(key)
+    if bundle is None:
+        model_pickle = load_asset(m, labs, 'model_explainer')
+        bundle = {
+            "task": get_task(m),
+            "labs": bool(labs),
+            "model": model_pickle["model"],
+            "explainer": model_pickle["explainer"],
+            "imputer": load_asset(m, labs, 'imputer')["imputer"],
+            "features": get_features(m, labs),
+            "columns": get_columns(m, labs)
+        }
+        bundle["layout"] = build_feature_layout(m, bundle["features"], len(bundle["columns"]))
+        bundle["imputer_index"] = build_imputer_index(bundle["imputer"])
+        bundle["trees"] = get_verified_trees(bundle["model"], bundle["imputer"]._fit_X[:verify_rows])
+        bundle["shap_tables"] = get_verified_shap_tables(bundle["trees"], bundle["explainer"], bundle["imputer"]._fit_X[:shap_verify_rows])
+        validate_model_bundle(bundle)
+        _bundles[key] = bundle
+    return bundle
+
+def load_model_bundles():
+    #every model that has its pickles, for the warm-up
+    for m in [True, False]:
+        for labs in [True, False]:
+            if os.path.exists(get_asset_path(m, labs, 'model_explainer')):
+                get_model_bundle(m, labs)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from sized_lru import SizedLRU
+
+#bounded LRU of calculator results, keyed on the model and the feature vector it was given
+#(temperature already in °F, missing values still missing). An entry keeps the numbers behind a
+#result, so the language dependent text is rebuilt from them, and the explanation image for
+#each language it has been drawn in. Images are most of an entry's size, hence the byte budget.
+max_entries = 1024
+max_bytes = 64*1024*1024
+
+_cache = SizedLRU(max_entries, max_bytes)
+
+def get_prediction_key(bundle, x):
+    #-0.0 and 0.0, and every nan, give the same key
+    x = np.where(np.isnan(x), np.nan, np.asarray(x, dtype=float) + 0.0)
+    return (bundle["task"], bundle["labs"], x.tobytes())
+
+def clear_prediction_cache():
+    _cache.clear()
+
+def get_cached_prediction(key):
+    return _cache.get(key)
+
+def cache_prediction(key, score, x_full, shap_values, expected_value):
+    for array in [x_full, shap_values]:
+        array.setflags(write=False)
+    entry = {
+        "score": score,
+        "x_full": x_full,
+        "shap_values": shap_values,
+        "expected_value": expected_value,
+        "plots": {}
+    }
+    _cache.put(key, entry, 0)
+    return entry
+
+def get_cached_plot(key, entry, language, render):
+    #render returns the plot and whether it is a fallback, which is not kept so that the next
+    #request for it tries the renderer again
+    plot = entry["plots"].get(language)
+    if plot is None:
+        plot, fallback = render()
+
+        def add_plot(entry):
+            if language in entry["plots"]:
+                return 0
+            entry["plots"][language] = plot
+            return len(plot)
+
+        if not fallback and len(plot) <= max_bytes:
+            #an entry already evicted no longer counts towards the budget
+            _cache.update(key, entry, add_plot)
+    return plot
+
+def get_prediction_cache_stats():
+    return _cache.stats()
@@ -0,0 +1,191 @@
+import os
+import sys
+import atexit
+import queue
+import pickle
+import select
+import struct
+import resource
+import threading
+import subprocess
+
+#Explanations drawn with shap and matplotlib are rendered in a few separate processes, so the web
+#workers never grow pyplot state. Each job has a deadline: a renderer that misses it is killed
+#and replaced. A renderer is also replaced once its resident memory goes over the cap, checked
+#after every job. Renderers are fresh interpreters running this module, so they hold neither the
+#app nor the data a worker has, and they are started on first use in each worker, after gunicorn
+#forks. Jobs and results go over the renderer's stdin and stdout as length prefixed pickles.
+render_workers = int(os.environ.get('EXPLANATION_WORKERS', 2))
+render_timeout = float(os.environ.get('EXPLANATION_TIMEOUT', 10))
+render_max_rss = int(os.environ.get('EXPLANATION_MAX_RSS_MB', 300))*1024*1024
+
+_pool = {
+    'pid': None,
+    'idle': None,
+    'running': 0,
+    'jobs': 0,
+    'timeouts': 0,
+    'failures': 0,
+    'recycled': 0
+}
+_pool_lock = threading.Lock()
+
+def get_rss():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1])*resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        #peak rather than current, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+def send_message(stream, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(struct.pack('<Q', len(data)) + data)
+    stream.flush()
+
+def read_exact(stream, n):
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            raise EOFError('Explanation renderer closed its pipe')
+        data += chunk
+    return data
+
+def receive_message(stream):
+    n, = struct.unpack('<Q', read_exact(stream, 8))
+    return pickle.loads(read_exact(stream, n))
+
+def serve(jobs, results):
+    from risk_calculator.explanations import renderers
+    while True:
+        try:
+            job = receive_message(jobs)
+        except EOFError:
+            break
+        if job is None:
+            break
+        renderer, args = job
+        try:
+            result = ('ok', renderers[renderer](*args))
+        except Exception as e:
+            result = ('error', repr(e))
+        send_message(results, result + (get_rss(),))
+
+def start_worker():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'risk_calculator.render_pool'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0, cwd=root)
+    with _pool_lock:
+        _pool['running'] += 1
+    return process
+
+def stop_worker(process, kill=False):
+    with _pool_lock:
+        _pool['running'] -= 1
+    if not kill:
+        try:
+            send_message(process.stdin, None)
+            process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            kill = True
+    if kill:
+        process.kill()
+        process.wait()
+    for stream in [process.stdin, process.stdout]:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+def replace_worker(idle):
+    #a fresh renderer takes a second or two to import shap and matplotlib, keep that off the request
+    def start():
+        try:
+            worker = start_worker()
+        except OSError:
+            #leave the slot empty, the next job will try again
+            worker = None
+        idle.put(worker)
+    threading.Thread(target=start, daemon=True).start()
+
+def get_idle_queue():
+    with _pool_lock:
+        if _pool['pid'] != os.getpid():
+            #first use in this process: a pool made before a fork belongs to the parent
+            _pool['pid'] = os.getpid()
+            _pool['idle'] = queue.Queue()
+            _pool['running'] = 0
+            for _ in range(render_workers):
+                _pool['idle'].put(None)
+        return _pool['idle']
+
+def render_in_pool(renderer, args):
+    #returns the renderer's result, or raises RuntimeError if no renderer could produce it in time
+    idle = get_idle_queue()
+    try:
+        worker = idle.get(timeout=render_timeout)
+    except queue.Empty:
+        raise RuntimeError('No explanation renderer free within {}s'.format(render_timeout))
+    try:
+        if worker is None:
+            worker = start_worker()
+        send_message(worker.stdin, (renderer, args))
+        if not select.select([worker.stdout], [], [], render_timeout)[0]:
+            with _pool_lock:
+                _pool['timeouts'] += 1
+            stop_worker(worker, kill=True)
+            replace_worker(idle)
+            raise RuntimeError('Explanation renderer timed out after {}s'.format(render_timeout))
+        status, value, rss = receive_message(worker.stdout)
+    except (EOFError, OSError) as e:
+        with _pool_lock:
+            _pool['failures'] += 1
+        if worker is not None:
+            stop_worker(worker, kill=True)
+        replace_worker(idle)
+        raise RuntimeError('Explanation renderer failed: {!r}'.format(e))
+    with _pool_lock:
+        _pool['jobs'] += 1
+    if rss > render_max_rss:
+        with _pool_lock:
+            _pool['recycled'] += 1
+        stop_worker(worker)
+        replace_worker(idle)
+    else:
+        idle.put(worker)
+    if status != 'ok':
+        raise RuntimeError('Explanation renderer raised {}'.format(value))
+    return value
+
+def get_render_pool_stats():
+    with _pool_lock:
+        return {
+            'running': _pool['running'] if _pool['pid'] == os.getpid() else 0,
+            'size': render_workers,
+            'jobs': _pool['jobs'],
+            'timeouts': _pool['timeouts'],
+            'failures': _pool['failures'],
+            'recycled': _pool['recycled']
+        }
+
+def shutdown_render_pool():
+    idle = _pool['idle']
+    if idle is None or _pool['pid'] != os.getpid():
+        return
+    while True:
+        try:
+            worker = idle.get_nowait()
+        except queue.Empty:
+            break
+        if worker is not None:
+            stop_worker(worker)
+
+atexit.register(shutdown_render_pool)
+
+if __name__ == '__main__':
+    #results get the real stdout to themselves, anything the renderers print goes to stderr
+    results = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    serve(sys.stdin.buffer, results)
@@ -0,0 +1,123 @@
+import os
+import json
+import ctypes
+import ctypes.util
+import tempfile
+
+import numpy as np
+
+#The risk models are binary:logistic xgboost classifiers. export_trees flattens the booster into
+#one set of node arrays, with every tree's nodes offset into them, and predict_proba walks all the
+#trees for all the rows at once, level by level. It follows xgboost's float32 arithmetic: features
+#are compared as float32, leaves are summed in tree order in float32 and the sigmoid is taken in
+#float32, so the scores are the same bits as model.predict_proba.
+#rows scored per pass, the traversal holds a (rows, trees) node matrix
+predict_chunk_size = 128
+
+#xgboost takes the sigmoid with the C library's expf, which is not always the correctly rounded
+#float32 exp numpy would give, so call the same function when it can be found
+libm_path = ctypes.util.find_library('m')
+if libm_path:
+    libm_expf = ctypes.CDLL(libm_path).expf
+    libm_expf.restype = ctypes.c_float
+    libm_expf.argtypes = [ctypes.c_float]
+    expf = np.frompyfunc(libm_expf, 1, 1)
+else:
+    expf = None
+
+def load_booster_json(booster):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        booster.save_model(path)
+        with open(path) as file:
+            return json.load(file)["learner"]
+
+def export_trees(model):
+    learner = load_booster_json(model.get_booster())
+    objective = learner["objective"]["name"]
+    if objective != 'binary:logistic':
+        raise ValueError("Cannot export a {} model".format(objective))
+    trees = learner["gradient_booster"]["model"]["trees"]
+    sizes = [len(t["left_children"]) for t in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+
+    def concat(name, dtype):
+        return np.concatenate([np.asarray(t[name], dtype=dtype) for t in trees])
+
+    left = concat("left_children", np.int64)
+    right = concat("right_children", np.int64)
+    is_leaf = left == -1
+    tree_of_node = np.repeat(np.arange(len(trees)), sizes)
+    #child ids are local to their tree, leaves point to themselves so extra levels are no-ops
+    node_ids = np.arange(len(left), dtype=np.int64)
+    left = np.where(is_leaf, node_ids, left + offsets[tree_of_node]).astype(np.int32)
+    right = np.where(is_leaf, node_ids, right + offsets[tree_of_node]).astype(np.int32)
+    split_conditions = concat("split_conditions", np.float32)
+    base_score = np.float32(float(learner["learner_model_param"]["base_score"]))
+    return {
+        "n_features": int(learner["learner_model_param"]["num_feature"]),
+        "roots": offsets.astype(np.int32),
+        "feature": np.where(is_leaf, 0, concat("split_indices", np.int64)).astype(np.int32),
+        "threshold": np.where(is_leaf, np.float32(0), split_conditions),
+        "left": left,
+        "right": right,
+        "default_left": concat("default_left", np.int64).astype(bool),
+        "is_leaf": is_leaf,
+        "value": np.where(is_leaf, split_conditions, np.float32(0)),
+        "cover": concat("sum_hessian", np.float64),
+        "parent": np.where(concat("parents", np.int64) == 2147483647, -1, concat("parents", np.int64) + offsets[tree_of_node]),
+        "depth": max_depth(trees),
+        #xgboost starts every row from the margin of base_score
+        "base_margin": np.float32(-np.log(np.float32(1)/base_score - np.float32(1)))
+    }
+
+def max_depth(trees):
+    depth = 0
+    for t in trees:
+        level = [0]
+        d = 0
+        while level:
+            level = [c for n in level for c in (t["left_children"][n], t["right_children"][n]) if c != -1]
+            d += 1 if level else 0
+        depth = max(depth, d)
+    return depth
+
+def get_leaves(trees, X):
+    #leaf node ids, one column per tree
+    offsets = (np.arange(len(X), dtype=np.int32)*X.shape[1])[:, np.newaxis]
+    X = X.ravel()
+    missing = np.isnan(X).any()
+    node = np.repeat(trees["roots"][np.newaxis, :], len(offsets), axis=0)
+    for _ in range(trees["depth"]):
+        fvalue = X.take(offsets + trees["feature"].take(node))
+        go_left = fvalue < trees["threshold"].take(node)
+        if missing:
+            go_left = np.where(np.isnan(fvalue), trees["default_left"].take(node), go_left)
+        node = np.where(go_left, trees["left"].take(node), trees["right"].take(node))
+    return node
+
+def predict_margin(trees, X):
+    X = np.asarray(X, dtype=np.float32).reshape(-1, trees["n_features"])
+    margin = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), predict_chunk_size):
+        leaves = get_leaves(trees, X[start:start+predict_chunk_size])
+        #accumulate in tree order, as xgboost does, rather than numpy's pairwise sum
+        total = np.cumsum(trees["value"].take(leaves), axis=1, dtype=np.float32)[:, -1]
+        margin[start:start+predict_chunk_size] = trees["base_margin"] + total
+    return margin
+
+def predict_proba(trees, X):
+    margin = predict_margin(trees, X)
+    #1.0f / (1.0f + expf(-x))
+    if expf is not None:
+        e = expf(-margin).astype(np.float32)
+    else:
+        e = np.exp(-margin.astype(np.float64)).astype(np.float32)
+    p = np.float32(1)/(np.float32(1) + e)
+    return np.vstack((1.0 - p, p)).transpose()
+
+def verify_trees(trees, model, X):
+    #rows whose score differs in any bit from model.predict_proba
+    expected = model.predict_proba(np.asarray(X, dtype=float), validate_features=False)[:, 1]
+    got = predict_proba(trees, X)[:, 1]
+    return int((expected.view(np.int32) != got.astype(expected.dtype).view(np.int32)).sum())
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+
+#Exact TreeSHAP values (tree_path_dependent, raw margin output) worked out from one table per
+#root-to-leaf path, built once from the exported trees. For a path with unique features
+#j = 1..d, zero fractions z_j (child cover over parent cover) and one fractions o_j (whether the
+#row follows every split on j along the path), feature i gets
+#    v * (o_i - z_i) * sum_k c_k e_k,   c_k = k!(d-1-k)!/d!
+#where v is the leaf value and e_k the coefficient of t^k in prod_{j != i} (z_j + o_j t).
+#The one fractions only depend on which of the path's splits a row strays from, so each path's
+#contributions are tabulated for every combination of strayed splits when the model is loaded,
+#and explaining rows comes down to one comparison per node and a gather from the table.
+
+def get_paths(trees, root):
+    #(leaf, [(node, went_left), ...]) for every leaf under root
+    paths = []
+    stack = [(root, [])]
+    while stack:
+        node, steps = stack.pop()
+        if trees["is_leaf"][node]:
+            paths.append((node, steps))
+            continue
+        stack.append((trees["right"][node], steps + [(node, False)]))
+        stack.append((trees["left"][node], steps + [(node, True)]))
+    return paths
+
+def get_contributions(value, zero, one):
+    #what each unique feature of each path gets for the given one fractions
+    d = zero.shape[1]
+    weights = np.array([math.factorial(k)*math.factorial(d-1-k)/math.factorial(d) for k in range(d)])
+    contributions = np.empty(zero.shape)
+    for i in range(d):
+        #coefficients of prod_{j != i} (z_j + o_j t), lowest power first
+        poly = np.zeros(zero.shape)
+        poly[:, 0] = 1
+        for j in range(d):
+            if j == i:
+                continue
+            shifted = np.zeros_like(poly)
+            shifted[:, 1:] = poly[:, :-1]*one[:, j:j+1]
+            poly = poly*zero[:, j:j+1] + shifted
+        contributions[:, i] = value*(one[:, i] - zero[:, i])*(poly @ weights)
+    return contributions
+
+def get_node_means(trees):
+    #cover weighted mean of the leaves under every node, taken from the children's means the way
+    #xgboost does: a node's cover is not always exactly the sum of its children's
+    means = trees["value"].astype(np.float64)
+    left, right, cover = trees["left"], trees["right"], trees["cover"]
+    for _ in range(trees["depth"]):
+        children = (means[left]*cover[left] + means[right]*cover[right])/cover
+        means = np.where(trees["is_leaf"], means, children)
+    return means
+
+def get_shap_tables_size(trees):
+    #entries of the contribution table build_shap_tables would make: 2**depth rows of depth values
+    #for every path that has a split
+    depth = max(trees["depth"], 1)
+    n_paths = np.count_nonzero(trees["is_leaf"]) - np.count_nonzero(trees["is_leaf"][trees["roots"]])
+    return n_paths*2**depth*depth
+
+def build_shap_tables(trees):
+    depth = max(trees["depth"], 1)
+    n_features = trees["n_features"]
+    paths = []
+    for root in trees["roots"]:
+        for leaf, steps in get_paths(trees, root):
+            #a tree that is a single leaf only moves the expected value
+            if steps:
+                paths.append((leaf, steps))
+    #every path is padded to the full depth by repeating its first split, which a row strays
+    #from exactly when it strays from the first one
+    split = np.zeros((len(paths), depth), dtype=int)
+    left = np.zeros((len(paths), depth), dtype=bool)
+    slot = np.zeros((len(paths), depth), dtype=int)
+    features = np.full((len(paths), depth), n_features)
+    zero = np.ones((len(paths), depth))
+    unique = np.zeros(len(paths), dtype=int)
+    for p, (leaf, steps) in enumerate(paths):
+        found = []
+        for s, (node, went_left) in enumerate(steps + [steps[0]]*(depth - len(steps))):
+            if trees["feature"][node] not in found:
+                found.append(trees["feature"][node])
+            u = found.index(trees["feature"][node])
+            split[p, s], left[p, s], slot[p, s] = node, went_left, u
+            if s < len(steps):
+                child = trees["left"][node] if went_left else trees["right"][node]
+                zero[p, u] *= trees["cover"][child]/trees["cover"][node]
+        unique[p] = len(found)
+        features[p, :len(found)] = found
+    value = trees["value"][[leaf for leaf, _ in paths]].astype(np.float64)
+    #(paths, 2**depth, depth): contributions when the row strays from the splits set in the index
+    contributions = np.zeros((len(paths), 2**depth, depth))
+    for d in range(1, depth+1):
+        group = np.flatnonzero(unique == d)
+        for strays in range(2**depth):
+            one = np.ones((len(group), d))
+            for s in range(depth):
+                if (strays >> s) & 1:
+                    one[np.arange(len(group)), slot[group, s]] = 0
+            contributions[group, strays, :d] = get_contributions(value[group], zero[group, :d], one)
+    return {
+        "n_features": n_features,
+        "split": split,
+        "left": left,
+        "step_bits": 1 << np.arange(depth),
+        "contributions": contributions,
+        #(paths * depth, n_features): sends every contribution to its feature's column, padding nowhere
+        "scatter": np.eye(n_features+1)[features.ravel(), :n_features],
+        "expected_value": float(trees["base_margin"]) + float(get_node_means(trees)[trees["roots"]].sum())
+    }
+
+def shap_values(trees, tables, X):
+    X = np.asarray(X, dtype=np.float32).reshape(-1, tables["n_features"])
+    #which way every row goes at every node, as xgboost decides it
+    fvalue = X[:, trees["feature"]]
+    go_left = np.where(np.isnan(fvalue), trees["default_left"], fvalue < trees["threshold"])
+    strays = (go_left[:, tables["split"]] != tables["left"]) @ tables["step_bits"]
+    paths = np.arange(strays.shape[1])
+    return tables["contributions"][paths, strays].reshape(len(X), -1) @ tables["scatter"]
+
+def verify_shap_tables(trees, tables, explainer, X):
+    #largest absolute difference from explainer.shap_values and explainer.expected_value
+    X = np.asarray(X, dtype=float)
+    expected = np.asarray(explainer.shap_values(X), dtype=float)
+    return max(
+        float(np.abs(shap_values(trees, tables, X) - expected).max()) if len(X) else 0.0,
+        abs(tables["expected_value"] - float(explainer.expected_value))
+    )
@@ -1,32 +1,32 @@
 import numpy as np
-import pandas as pd
 import math
-import shap
-import pickle
-import matplotlib
-import matplotlib.pyplot as plt
-from textwrap import wrap
+from functools import lru_cache
+from types import MappingProxyType
 
 import risk_calculator.english as english
 import risk_calculator.spanish as spanish
 import risk_calculator.italian as italian
+from risk_calculator.models import get_features, get_model_data, predict_scores, explain_rows
+from risk_calculator.explanations import render_explanation
+from risk_calculator.imputation import impute
+from risk_calculator.prediction_cache import get_prediction_key, get_cached_prediction, cache_prediction, get_cached_plot
 
-matplotlib.use('Agg')
 oxygen = 'Oxygen Saturation'
 
+#both tables are built once per worker and are read only, so callbacks only do dictionary lookups
+@lru_cache(maxsize=None)
 def get_title_mapping():
-    return {
-        0: english.get_feature_names(),
-        1: spanish.get_feature_names(),
-        2: italian.get_feature_names()
-    }
+    return MappingProxyType({
+        0: MappingProxyType(english.get_feature_names()),
+        1: MappingProxyType(spanish.get_feature_names()),
+        2: MappingProxyType(italian.get_feature_names())
+    })
 
+@lru_cache(maxsize=None)
 def get_languages():
-    with open('assets/risk_calculators/mortality/labs_data.pkl', 'rb') as file:
-        mort_labs = pickle.load(file)
-
-    with open('assets/risk_calculators/mortality/without_labs_data.pkl', 'rb') as file:
-        mort_no_labs = pickle.load(file)
+    #localized page content keyed by (content, language)
+    mort_labs = get_model_data(True, True)
+    mort_no_labs = get_model_data(True, False)
 
     cols_labs_mort = mort_labs["columns"]
     labs_auc_mort = mort_labs["AUC"]
@@ -38,11 +38,8 @@ def get_languages():
     no_labs_population_mort = [mort_no_labs["Size Training"],mort_no_labs["Size Test"]]
     no_labs_positive_mort = [mort_no_labs["Percentage Training"],mort_no_labs["Percentage Test"]]
 
-    with open('assets/risk_calculators/infection/labs_data.pkl', 'rb') as file:
-        infec_labs = pickle.load(file)
-
-    with open('assets/risk_calculators/infection/without_labs_data.pkl', 'rb') as file:
-        infec_no_labs = pickle.load(file)
+    infec_labs = get_model_data(False, True)
+    infec_no_labs = get_model_data(False, False)
 
     cols_labs_infec = infec_labs["columns"]
     labs_auc_infec = infec_labs["AUC"]
@@ -54,7 +51,7 @@ def get_languages():
     no_labs_population_infec = [infec_no_labs["Size Training"],infec_no_labs["Size Test"]]
     no_labs_positive_infec = [infec_no_labs["Percentage Training"],infec_no_labs["Percentage Test"]]
 
-    return {
+    content = {
         "page_desc_mortality": {
             0: english.get_page_desc_mortality(labs_auc_mort,no_labs_auc_mort),
             1: spanish.get_page_desc_mortality(labs_auc_mort,no_labs_auc_mort),
@@ -116,6 +113,7 @@ def get_languages():
             2: italian.get_visual_1()
         }
     }
+    return MappingProxyType({(name, language): text for name, texts in content.items() for language, text in texts.items()})
 
 def convert_temp_units(x):
     return x*9/5+32
@@ -136,13 +134,7 @@ def oxygen_vals(val,language):
 
 def get_oxygen_ind(m):
     title_mapping = get_title_mapping()
-    if m:
-        with open('assets/risk_calculators/mortality/without_labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-    else:
-        with open('assets/risk_calculators/infection/without_labs_json.pkl', 'rb') as file:
-            features_pickle = pickle.load(file)
-    feats = features_pickle["json"]["numeric"]
+    feats = get_features(m, False)["numeric"]
     for i,f in enumerate(feats):
         if title_mapping[0][f["name"]] == oxygen:
             return i
@@ -189,33 +181,36 @@ def valid_input(features,feature_vals,length,language):
         return False,text[language],feature_vals
     return True,"",feature_vals
 
-def predict_risk(m,model,features,imputer,explainer,feature_vals,columns,temp_unit,labs,language):
-    x = [0]*len(model.feature_importances_)
-    #if temperature is in F, switch measurement to Celsius
-    convert_temperature = temp_unit[0] == "°C"
-    #align order of feature vector so that values are in correct order
-    i = 0
-    for feat in features["categorical"]:
-        x[feat["index"]] = feature_vals[i]
-        i+=1
-    for f,feat in enumerate(features["numeric"]):
-        if feat["name"] == "Body Temperature" and convert_temperature:
-            x[feat["index"]] = convert_temp_units(feature_vals[i])
-        else:
-            x[feat["index"]] = feature_vals[i]
-        i+=1
-    if m:
-        comorbidities = feature_vals[i]
-        indexes = features["multidrop"][0]["index"]
-        for c in comorbidities:
-            ind = features["multidrop"][0]["vals"].index(c)
-            x[indexes[ind]] = 1
-    imputed = np.argwhere(np.isnan(x))
-    x_full = imputer.transform([x])
-    X = pd.DataFrame(columns = columns, index = range(1), dtype=np.float)
-    X.loc[0]=x_full[0]
-    score = model.predict_proba(X)[:,1]
-    score = int(100*round(score[0], 2))
+def build_feature_vector(layout,feature_vals,temp_unit,out=None):
+    #feature_vals is the calculator form order: categorical, numerics, then comorbidities if the model has them
+    x = np.zeros(layout["n"]) if out is None else out
+    n_cat = len(layout["categorical"])
+    n_num = len(layout["numeric"])
+    x[layout["categorical"]] = feature_vals[:n_cat]
+    numerics = np.array(feature_vals[n_cat:n_cat+n_num], dtype=float)
+    #if temperature is in Celsius, switch measurement to Fahrenheit
+    if temp_unit[0] == "°C":
+        numerics[layout["temperature"]] = convert_temp_units(numerics[layout["temperature"]])
+    x[layout["numeric"]] = numerics
+    if layout["comorbidities"]:
+        for c in feature_vals[n_cat+n_num]:
+            x[layout["comorbidities"][c]] = 1
+    return x
+
+def predict_risk(m,bundle,feature_vals,temp_unit,labs,language):
+    columns = bundle["columns"]
+    x = build_feature_vector(bundle["layout"],feature_vals,temp_unit)
+    imputed = np.flatnonzero(np.isnan(x))
+    #the same inputs in another language only need the text redone
+    key = get_prediction_key(bundle,x)
+    entry = get_cached_prediction(key)
+    if entry is None:
+        x_full = impute(bundle["imputer_index"],x[np.newaxis])
+        #columns are in training order, checked when the model is loaded
+        score = predict_scores(bundle,x_full)
+        score = int(100*round(score[0], 2))
+        entry = cache_prediction(key,score,x_full,explain_rows(bundle,x_full),bundle["explainer"].expected_value)
+    x_full = entry["x_full"]
     impute_text = [''] * len(imputed)
     missing_text = [
         ['The missing feature, ',', was calculated as '],
@@ -224,7 +219,6 @@ def predict_risk(m,model,features,imputer,explainer,feature_vals,columns,temp_un
         ]
     title_mapping = get_title_mapping()
     for i,ind in enumerate(imputed):
-        ind = int(ind)
         text = missing_text[language][0] + title_mapping[language][columns[ind]] + missing_text[language][1]
         text += str(round(x_full[0][ind],2))
         if columns[ind] == 'Body Temperature':
@@ -232,19 +226,9 @@ def predict_risk(m,model,features,imputer,explainer,feature_vals,columns,temp_un
         else:
             impute_text[i] = text + '.'
     impute_text = '  \n'.join(impute_text)
-    shap_new = explainer.shap_values(X)
-    names = ['\n'.join(wrap(''.join(['{}'.format(title_mapping[language][c])]), width=12)) for c in columns]
-    plot = shap.force_plot(
-        np.around(explainer.expected_value, decimals=2),
-        np.around(shap_new, decimals=2),
-        np.around(X, decimals=2) ,
-        link = "logit",
-        matplotlib = True,
-        show = False,
-        feature_names=names
-    )
-    plt.axis('off') # this rows the rectangular frame
-    return score,impute_text,plot
+    names = [title_mapping[language][c] for c in columns]
+    plot = get_cached_plot(key,entry,language,lambda: render_explanation(entry["expected_value"],entry["shap_values"],x_full,names))
+    return entry["score"],impute_text,plot
 
 def build_lab_ques_card(lang):
     q = ["Do you have lab values?","¿Tienes valores de laboratorio?","Hai valori di laboratorio?"]
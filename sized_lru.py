@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+#LRU bounded both in entries and in bytes, shared by the figure, prediction and layout caches.
+#Callers give the size of what they put in, the cache only adds it up.
+class SizedLRU:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evict(self):
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def get(self, key, valid=None):
+        #valid(value) can turn down a stale value, which counts as a miss
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None or (valid is not None and not valid(item[0])):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            self.evict()
+
+    def update(self, key, value, change):
+        #change(value) alters value in place and returns the bytes it added, which count towards
+        #the budget while value is still cached under key
+        with self.lock:
+            size = change(value)
+            item = self.entries.get(key)
+            if item is not None and item[0] is value:
+                self.entries[key] = (value, item[1] + size)
+                self.bytes += size
+                self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def items(self):
+        with self.lock:
+            return [(key, value) for key, (value, _) in self.entries.items()]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -6,14 +6,10 @@ import dash_html_components as html
 from ventilators.utils import get_df_mod1_transfers,get_df_mod1_projections
 from ventilators.utils import get_df_mod2_transfers,get_df_mod2_projections
 from ventilators.utils import us_map, us_timeline, get_no_model_visual, get_model_visual
+from ventilators.utils import get_df_optimized_projections
 
 def build_transfers_map(chosen_model,chosen_date,p1,p2,p3):
-    if chosen_model == "Washington IHME":
-        df_map = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    else:
-        df_map = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
-
-    df_map.loc[:,'Date'] = pd.to_datetime(df_map['Date'], format='y%m%d').dt.date
+    df_map = get_df_optimized_projections(chosen_model)
     df_map = df_map.loc[df_map.Param1==float(p1)]
     df_map = df_map.loc[df_map.Param2==float(p2)]
     df_map = df_map.loc[df_map.Param3==float(p3)]
@@ -23,12 +19,10 @@ def build_transfers_map(chosen_model,chosen_date,p1,p2,p3):
 def build_transfers_timeline(chosen_model,p1,p2,p3):
     if chosen_model == "Washington IHME":
         df_opt_pre, _ = get_df_mod1_projections()
-        df_opt_post = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
     else:
         df_opt_pre = get_df_mod2_projections()
-        df_opt_post = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
+    df_opt_post = get_df_optimized_projections(chosen_model)
 
-    df_opt_post.loc[:,'Date'] = pd.to_datetime(df_opt_post['Date'], format='y%m%d').dt.date
     timeline_cols = ["Date","Shortage"]
     df_opt_pre = df_opt_pre.loc[df_opt_pre.State == 'US']
     df_opt_pre = df_opt_pre[timeline_cols]
@@ -1,16 +1,109 @@
+import os
 import datetime
-import urllib
 import math
-import pandas as pd
+import threading
 from textwrap import wrap
 import plotly.graph_objects as go
 import dash_core_components as dcc
 
 from assets.mappings import get_states, get_colors
+from columnar import get_columnar_path, get_mtime, is_current, read_csv, read_frame, write_frame
+from downloads import get_download_url
+
+transfers_paths = {
+    "ihme": 'data/predicted_ventilator/transfers_table-ihme.csv',
+    "ode": 'data/predicted_ventilator/transfers_table-ode.csv'
+}
+baseline_paths = {
+    "ihme": 'data/predicted_ventilator/state_supplies_table_baseline-ihme.csv',
+    "ode": 'data/predicted_ventilator/state_supplies_table_baseline-ode.csv'
+}
+optimized_paths = {
+    "ihme": 'data/predicted_ventilator/state_supplies_table-ihme.csv',
+    "ode": 'data/predicted_ventilator/state_supplies_table-ode.csv'
+}
+
+#what the csvs must hold, checked when they are parsed (see columnar.read_csv). The parameters
+#are the optimization's, fractions in the transfers and optimized tables
+transfers_schema = {
+    'State_From': 'category',
+    'State_To': 'category',
+    'Date': 'date',
+    'Num_Units': 'category',
+    'Param1': 'float32',
+    'Param2': 'float32',
+    'Param3': 'float32'
+}
+baseline_schema = {
+    'State': 'category',
+    'Date': 'date',
+    'Shortage': 'float32',
+    'Supply': 'float32',
+    'Demand': 'int32',
+    'Param1': 'int32',
+    'Param2': 'int32',
+    'Param3': 'int32'
+}
+optimized_schema = dict(baseline_schema, Param1='float32', Param2='float32', Param3='float32')
+
+#ventilator tables are loaded once per process (before fork under gunicorn --preload) and again
+#when their csv, or the columnar copy mapped in its place, changes on disk. The frames are
+#shared, treat them as read-only.
+_tables = {}
+_tables_lock = threading.Lock()
+
+def get_schema(path):
+    for paths, schema in [(transfers_paths, transfers_schema), (baseline_paths, baseline_schema), (optimized_paths, optimized_schema)]:
+        if path in paths.values():
+            return schema
+
+def parse_ventilator_table(path):
+    return read_csv(path, get_schema(path))
+
+def read_ventilator_table(path):
+    if is_current(get_columnar_path(path), [path]):
+        return read_frame(get_columnar_path(path))
+    return parse_ventilator_table(path)
+
+def get_ventilator_tables():
+    tables = []
+    for paths in [transfers_paths, baseline_paths, optimized_paths]:
+        for path in paths.values():
+            if os.path.exists(path):
+                tables.append({
+                    "path": get_columnar_path(path),
+                    "sources": [path],
+                    "parse": lambda path=path: parse_ventilator_table(path),
+                    "write": lambda columnar_path, df, path=path: write_frame(columnar_path, df, get_schema(path))
+                })
+    return tables
+
+def get_ventilator_table(path):
+    mtime = (os.path.getmtime(path), get_mtime(get_columnar_path(path)))
+    table = _tables.get(path)
+    if table is None or table[0] != mtime:
+        with _tables_lock:
+            table = _tables.get(path)
+            if table is None or table[0] != mtime:
+                table = (mtime, read_ventilator_table(path))
+                _tables[path] = table
+    return table[1]
+
+def load_ventilator_tables():
+    for paths in [transfers_paths, baseline_paths, optimized_paths]:
+        for path in paths.values():
+            if os.path.exists(path):
+                get_ventilator_table(path)
+
+def get_ventilators_version():
+    load_ventilator_tables()
+    return tuple(_tables[path][0] for path in sorted(_tables))
+
+def get_model_key(chosen_model):
+    return "ihme" if chosen_model == "Washington IHME" else "ode"
 
 def get_df_mod1_transfers(params=False):
-    df = pd.read_csv('data/predicted_ventilator/transfers_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
+    df = get_ventilator_table(transfers_paths["ihme"])
     if params:
         p1 = df.Param1.unique()
         p2 = df.Param2.unique()
@@ -21,13 +114,10 @@ def get_df_mod1_transfers(params=False):
     return df, None
 
 def get_df_mod2_transfers():
-    df = pd.read_csv('data/predicted_ventilator/transfers_table-ode.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
-    return df
+    return get_ventilator_table(transfers_paths["ode"])
 
 def get_df_mod1_projections(params=False):
-    df = pd.read_csv('data/predicted_ventilator/state_supplies_table_baseline-ihme.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
+    df = get_ventilator_table(baseline_paths["ihme"])
     if params:
         min_shortage_date = min(df.Date.values)
         max_shortage_date = max(df.Date.values)
@@ -35,9 +125,10 @@ def get_df_mod1_projections(params=False):
     return df, None
 
 def get_df_mod2_projections():
-    df = pd.read_csv('data/predicted_ventilator/state_supplies_table_baseline-ode.csv', sep=",", parse_dates = ['Date'])
-    df.loc[:,'Date'] = pd.to_datetime(df['Date'], format='y%m%d').dt.date
-    return df
+    return get_ventilator_table(baseline_paths["ode"])
+
+def get_df_optimized_projections(chosen_model):
+    return get_ventilator_table(optimized_paths[get_model_key(chosen_model)])
 
 def get_first_date():
     return datetime.date(2020, 4, 15)
@@ -189,21 +280,22 @@ def us_timeline(df, title, with_opt):
     return graph
 
 
+def get_ventilator_downloads():
+    downloads = []
+    for kind, paths in [("demand", optimized_paths), ("transfers", transfers_paths)]:
+        for key, path in paths.items():
+            if os.path.exists(path):
+                downloads.append({
+                    "name": 'ventilator_{}_{}'.format(kind, key),
+                    "filename": 'covid_analytics_ventilator_{}'.format(kind),
+                    "sources": [path],
+                    "frame": lambda path=path: get_ventilator_table(path)
+                })
+    return downloads
+
 def build_download_link_demand(chosen_model):
-    if chosen_model == "Washington IHME":
-        df_shortage = pd.read_csv('data/predicted_ventilator/state_supplies_table-ihme.csv', sep=",", parse_dates = ['Date'])
-    else:
-        df_shortage = pd.read_csv('data/predicted_ventilator/state_supplies_table-ode.csv', sep=",", parse_dates = ['Date'])
-    df_shortage = df_shortage.to_csv(index=False, encoding='utf-8')
-    state_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(df_shortage)
-    return state_csv_string
+    return get_download_url('ventilator_demand_{}'.format(get_model_key(chosen_model)))
 
 def build_download_link_transfers(chosen_model):
-    df_mod1_transfers, _ = get_df_mod1_transfers()
-    df_mod2_transfers = get_df_mod2_transfers()
-    if chosen_model == "Washington IHME":
-        transfers_csv_string = df_mod1_transfers.to_csv(index=False, encoding='utf-8')
-    else:
-        transfers_csv_string = df_mod1_transfers.to_csv(index=False, encoding='utf-8')
-    transfers_csv_string = "data:text/csv;charset=utf-8," + urllib.parse.quote(transfers_csv_string)
-    return transfers_csv_string
+    #the IHME transfers whichever model is chosen, as the page has always offered
+    return get_download_url('ventilator_transfers_ihme')